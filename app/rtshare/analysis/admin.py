@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import ConfigurationSummaryResult
+from .models import ConfigurationSummaryResult, WaterfallResult
 
 
 @admin.register(ConfigurationSummaryResult)
@@ -23,3 +23,26 @@ class ConfigurationSummaryResultAdmin(admin.ModelAdmin):
         'telescope',
         'configuration',
     )
+
+
+@admin.register(WaterfallResult)
+class WaterfallResultAdmin(admin.ModelAdmin):
+
+    list_display = (
+        'id',
+        'configuration',
+        'sample_count',
+        'created_at',
+        'updated_at',
+    )
+
+    readonly_fields = (
+        'uuid',
+        'created_at',
+        'updated_at',
+    )
+
+    list_filter = (
+        'telescope',
+        'configuration',
+    )
@@ -0,0 +1,131 @@
+""" A size-bounded, on-disk cache of the products derived from each sample
+(spectra, summary stats, etc). Entries are keyed by the sample and the
+parameters used to derive them so that changing the analysis never reads stale
+results. When the cache grows past its limit the least recently used entries
+are evicted.
+
+The directory is only scanned for its size when an estimate (kept from the
+last scan and this process's writes since) says the limit was passed, so
+entries written by other processes are accounted for at the next scan.
+"""
+import hashlib
+import json
+import logging
+import os
+import os.path
+import tempfile
+
+from django.conf import settings
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+EXTENSION = '.npz'
+
+# The estimated size of each cache directory (in bytes) since it was scanned.
+_sizes = {}
+
+
+def make_key(sample_uuid, **parameters):
+    parameters = json.dumps(parameters, sort_keys=True, default=str)
+    digest = hashlib.sha256(parameters.encode('utf-8')).hexdigest()[:16]
+    return f'{sample_uuid}-{digest}'
+
+
+def _get_path(key, directory):
+    return os.path.join(directory, f'{key}{EXTENSION}')
+
+
+def touch(key, directory=None):
+    """ Mark the entry as recently used. Returns whether the entry exists. """
+    if directory is None:
+        directory = settings.ANALYSIS_CACHE_PATH
+
+    try:
+        os.utime(_get_path(key, directory))
+    except FileNotFoundError:
+        return False
+    else:
+        return True
+
+
+def get(key, directory=None):
+    """ Fetch the arrays stored for the given key or None if there are none. """
+    if directory is None:
+        directory = settings.ANALYSIS_CACHE_PATH
+
+    path = _get_path(key, directory)
+    try:
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f'Discarding unreadable cache entry {key}: {e}')
+        _remove(path)
+        return None
+
+    touch(key, directory)
+    return arrays
+
+
+def put(key, arrays, directory=None, max_size=None):
+    """ Store the given arrays under the key and evict old entries if needed. """
+    if directory is None:
+        directory = settings.ANALYSIS_CACHE_PATH
+    if max_size is None:
+        max_size = settings.ANALYSIS_CACHE_SIZE
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file first so readers never see a partial entry.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, _get_path(key, directory))
+    except Exception:
+        _remove(tmp_path)
+        raise
+
+    if directory in _sizes:
+        _sizes[directory] += size
+    if _sizes.get(directory, max_size + 1) > max_size:
+        evict(directory, max_size)
+
+
+def evict(directory=None, max_size=None):
+    """ Remove the least recently used entries until the cache fits. """
+    if directory is None:
+        directory = settings.ANALYSIS_CACHE_PATH
+    if max_size is None:
+        max_size = settings.ANALYSIS_CACHE_SIZE
+
+    entries = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(EXTENSION):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        logger.debug(f'Evicting cache entry {path}')
+        _remove(path)
+        total -= size
+
+    _sizes[directory] = total
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.8 on 2026-10-18 07:35
+
+import django.core.files.storage
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0003_alter_configurationsummaryresult_fft_video_file_and_more'),
+        ('observations', '0003_configuration_processing_state'),
+        ('telescope', '0017_delete_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaterfallResult',
+            fields=[
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The exact time when a record was created.')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The exact time when a record was last updated.')),
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('uuid', models.UUIDField(default=uuid.uuid4, help_text='The unique identifier for this record.', unique=True)),
+                ('sample_count', models.PositiveIntegerField(default=0, help_text='The number of samples (rows) in the waterfall.')),
+                ('data_file', models.FileField(blank=True, default=None, help_text='The float32 waterfall array in .npy format.', null=True, storage=django.core.files.storage.FileSystemStorage(), upload_to='starsweep/results/')),
+                ('preview_file', models.FileField(blank=True, default=None, help_text='A rendered image of the waterfall.', null=True, storage=django.core.files.storage.FileSystemStorage(), upload_to='starsweep/results/')),
+                ('configuration', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waterfall_results', to='observations.configuration')),
+                ('telescope', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waterfall_results', to='telescope.telescope')),
+            ],
+            options={
+                'ordering': ('-id',),
+                'unique_together': {('telescope', 'configuration')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.8 on 2026-10-18 08:07
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0004_waterfallresult'),
+        ('observations', '0003_configuration_processing_state'),
+        ('telescope', '0017_delete_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waterfallresult',
+            name='is_stale',
+            field=models.BooleanField(default=False, help_text='Whether rows have been added since the files were rendered.'),
+        ),
+        migrations.CreateModel(
+            name='WaterfallRow',
+            fields=[
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The exact time when a record was created.')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The exact time when a record was last updated.')),
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('uuid', models.UUIDField(default=uuid.uuid4, help_text='The unique identifier for this record.', unique=True)),
+                ('captured_at', models.DateTimeField(help_text='When the sample was captured (or received, if unknown).')),
+                ('data', models.BinaryField(help_text='The float32 power spectrum.')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='analysis.waterfallresult')),
+                ('sample', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='waterfall_row', to='observations.sample')),
+            ],
+            options={
+                'ordering': ('captured_at', 'id'),
+                'indexes': [models.Index(fields=['result', 'captured_at'], name='analysis_wa_result__4f4361_idx')],
+            },
+        ),
+    ]
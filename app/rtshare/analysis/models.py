@@ -51,3 +51,102 @@ class ConfigurationSummaryResult(BaseModel):
 
     class Meta:
         ordering = ('-id',)
+
+
+class WaterfallResult(BaseModel):
+    """ A time by frequency array of the power spectra of each sample in a
+    configuration. A row is stored as each sample arrives and the array and
+    preview are re-rendered from the rows (in capture order) periodically.
+    """
+
+    telescope = models.ForeignKey(
+        'telescope.Telescope',
+        related_name='waterfall_results',
+        on_delete=models.SET_NULL,
+        default=None,
+        null=True,
+        blank=True,
+    )
+
+    configuration = models.ForeignKey(
+        'observations.Configuration',
+        related_name='waterfall_results',
+        on_delete=models.SET_NULL,
+        default=None,
+        null=True,
+        blank=True,
+    )
+
+    sample_count = models.PositiveIntegerField(
+        default=0,
+        help_text=(
+            'The number of samples (rows) in the waterfall.'
+        )
+    )
+
+    data_file = models.FileField(
+        storage=get_storage(),
+        upload_to='starsweep/results/',
+        default=None,
+        null=True,
+        blank=True,
+        help_text=(
+            'The float32 waterfall array in .npy format.'
+        )
+    )
+
+    preview_file = models.FileField(
+        storage=get_storage(),
+        upload_to='starsweep/results/',
+        default=None,
+        null=True,
+        blank=True,
+        help_text=(
+            'A rendered image of the waterfall.'
+        )
+    )
+
+    is_stale = models.BooleanField(
+        default=False,
+        help_text=(
+            'Whether rows have been added since the files were rendered.'
+        )
+    )
+
+    class Meta:
+        ordering = ('-id',)
+        unique_together = ('telescope', 'configuration')
+
+
+class WaterfallRow(BaseModel):
+    """ The power spectrum of a single sample in a waterfall. """
+
+    result = models.ForeignKey(
+        'analysis.WaterfallResult',
+        related_name='rows',
+        on_delete=models.CASCADE,
+    )
+
+    sample = models.OneToOneField(
+        'observations.Sample',
+        related_name='waterfall_row',
+        on_delete=models.CASCADE,
+    )
+
+    captured_at = models.DateTimeField(
+        help_text=(
+            'When the sample was captured (or received, if unknown).'
+        )
+    )
+
+    data = models.BinaryField(
+        help_text=(
+            'The float32 power spectrum.'
+        )
+    )
+
+    class Meta:
+        ordering = ('captured_at', 'id')
+        indexes = (
+            models.Index(fields=('result', 'captured_at')),
+        )
@@ -1,127 +1,274 @@
+from contextlib import contextmanager
 from datetime import timedelta
+import io
+import json
 import logging
 import os.path
 import shlex
-from subprocess import call
+from subprocess import CalledProcessError, DEVNULL, PIPE, Popen
 import tempfile
 import uuid
 
+from billiard import Pool
 from celery import group
+from django.conf import settings
 from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import transaction
 from django.utils import timezone
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import scipy.fftpack
 import scipy.signal
 
 from rtshare.celery import shared_task, Queue, Priority
-from rtshare.utils.iqd import get_data, get_header
+from rtshare.utils.iqd import get_samples, get_header, iter_samples
 from rtshare.utils.units import display_hz
-from observations.models import Configuration
-from .models import ConfigurationSummaryResult
+from observations.models import Configuration, Sample
+from . import cache
+from .models import ConfigurationSummaryResult, WaterfallResult, WaterfallRow
 
 
 logger = logging.getLogger(__name__)
 
+# Frames are rasterized at a fixed size so they can be streamed to ffmpeg as
+# raw video.
+FRAME_SIZE = (640, 480)
+FRAME_DPI = 100
+
+_frames = {}
+
+# The parameters used to derive the cached spectra of each sample. Bump the
+# version when the derivation changes so that stale entries are ignored.
+SPECTRUM_PARAMETERS = {
+    'version': 2,
+    'window': 'flattop',
+    'scaling': 'spectrum',
+    'bins': 4096,
+}
+
+
+def get_file(sample, workbench):
+    logger.debug(f'Copying data for {sample.data} to {workbench}')
+    filename = os.path.basename(sample.data.name)
+    path = os.path.join(workbench, filename)
+    with (
+        sample.data.open('rb') as source,
+        open(path, 'wb') as destination
+    ):
+        destination.write(source.read())
+    return path
+
+
+def get_frame(name, ylabel, yscale='linear'):
+    """ Fetch the figure used to rasterize the given kind of frame. Figures are
+    created once per process and reused, so rendering a frame only redraws the
+    plot into the existing RGB buffer.
+    """
+    if name not in _frames:
+        width, height = FRAME_SIZE
+        fig = Figure(figsize=(width / FRAME_DPI, height / FRAME_DPI), dpi=FRAME_DPI)
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        line, = ax.plot([], [])
+        ax.set_yscale(yscale)
+        ax.set_xlabel('frequency [Hz]')
+        ax.set_ylabel(ylabel)
+        _frames[name] = (canvas, ax, line)
+    return _frames[name]
+
+
+def rasterize(frame, x, y, title):
+    canvas, ax, line = frame
+    line.set_data(x, y)
+    ax.relim()
+    ax.autoscale_view()
+    ax.set_title(title)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[:, :, :3].tobytes()
+
+
+def compute_spectra(header, iq, bins=SPECTRUM_PARAMETERS['bins']):
+    """ Derive the products of a sample used by the summary visualizations.
+    Both spectra are reduced to `bins` points, which is all a frame can show,
+    and the frequency axes are cheap to rebuild so only the values are kept.
+    """
+    sample_rate = int(header['sample rate'])
 
-def get_files(samples, workbench):
-    files = []
-    for sample in samples:
-        logger.debug(f'Copying data for {sample.data} to {workbench}')
-        filename = os.path.basename(sample.data.name)
-        path = os.path.join(workbench, filename)
-        with (
-            sample.data.open('rb') as source,
-            open(path, 'wb') as destination
-        ):
-            destination.write(source.read())
+    # The magnitude of the full FFT, keeping the peak of each group of bins.
+    yf = scipy.fftpack.fftshift(1.0 / iq.size * np.abs(scipy.fftpack.fft(iq)))
+    groups = max(1, yf.size // bins)
+    yf = yf[:yf.size // groups * groups].reshape(-1, groups).max(axis=1)
+
+    f, S = scipy.signal.welch(
+        iq,
+        sample_rate,
+        SPECTRUM_PARAMETERS['window'],
+        nperseg=min(bins, iq.size),
+        scaling=SPECTRUM_PARAMETERS['scaling'],
+        return_onesided=False,
+    )
 
-        files.append(path)
-    return files
+    return {
+        'header': np.array(json.dumps(header)),
+        'fft': yf.astype(np.float32),
+        'spectrum': np.sqrt(S).astype(np.float32),
+        'mean_power': np.mean(np.abs(iq) ** 2),
+        'peak_frequency': f[np.argmax(S)],
+    }
 
 
-def generate_fft(data_file, format='png'):
+def generate_fft(spectra):
     # TODO: include date in header + latlon?
-    with open(data_file, 'rb') as f:
-        header = get_header(f)
-        data = get_data(f)
+    header = json.loads(spectra['header'].item())
+    sample_rate = int(header['sample rate'])
+    center_f = int(header['frequency'])
+    capture_time = header['capture time']
+
+    yplot = spectra['fft']
+    xplot = scipy.fftpack.fftshift(scipy.fftpack.fftfreq(yplot.size, 1 / sample_rate))
+
+    return rasterize(
+        get_frame('fft', 'FFT'),
+        center_f + xplot,
+        yplot,
+        f'SR: {display_hz(sample_rate)} | {capture_time}',
+    )
 
-    if not data:
-        return
 
-    image_file = f'{data_file}.fft.{format}'
+def generate_spectrum(spectra):
+    # TODO: include date in header
+    header = json.loads(spectra['header'].item())
     sample_rate = int(header['sample rate'])
     center_f = int(header['frequency'])
     capture_time = header['capture time']
 
-    yf = scipy.fftpack.fft([i_q for i_q, _ in data])
-    xf = scipy.fftpack.fftfreq(yf.size, 1 / sample_rate)
+    values = spectra['spectrum']
+    f = scipy.fftpack.fftfreq(values.size, 1 / sample_rate)
 
-    yplot = scipy.fftpack.fftshift(yf)
-    xplot = scipy.fftpack.fftshift(xf)
+    return rasterize(
+        get_frame('spectrum', 'Linear spectrum [V RMS]', yscale='log'),
+        center_f + f,
+        values,
+        f'SR: {display_hz(sample_rate)} | {capture_time}',
+    )
 
-    fig, ax = plt.subplots()
-    ax.plot(center_f + xplot, 1.0 / yplot.size * np.abs(yplot))
-    plt.title(f'SR: {display_hz(sample_rate)} | {capture_time}')
-    plt.xlabel('frequency [Hz]')
-    plt.ylabel('FFT')
-    plt.savefig(image_file)
-    plt.close()
-    return image_file
 
+def generate_frames(key, data_file):
+    """ Rasterize both the FFT and spectrum frames for a sample as raw RGB
+    bytes. Spectra are read from the cache when possible; otherwise the sample
+    is decoded once and its spectra are cached for the next run.
+    """
+    if (spectra := cache.get(key)) is None:
+        if not data_file:
+            logger.warning(f'Cache entry {key} disappeared before it could be read.')
+            return
 
-def generate_spectrum(data_file, format='png'):
-    # TODO: include date in header
-    with open(data_file, 'rb') as f:
-        header = get_header(f)
-        data = get_data(f)
+        with open(data_file, 'rb') as f:
+            header = get_header(f)
+            iq, _ = get_samples(f)
+
+        if not iq.size:
+            return
+
+        spectra = compute_spectra(header, iq)
+        cache.put(key, spectra)
+
+    return generate_fft(spectra), generate_spectrum(spectra)
 
-    if not data:
+
+def map_frames(jobs, processes=None):
+    """ Render the frames for each (cache key, file) job across a pool of
+    processes. Frames are yielded in the order of their jobs, regardless of
+    which worker finishes first, so the video order matches the order of the
+    samples.
+
+    Celery's prefork workers are daemonic, which the standard library won't
+    start children from, so the pool comes from billiard (Celery's own fork
+    of multiprocessing) instead.
+    """
+    if processes is None:
+        processes = settings.ANALYSIS_PROCESSES
+
+    if processes <= 1 or len(jobs) <= 1:
+        yield from (generate_frames(key, data_file) for key, data_file in jobs)
         return
 
-    image_file = f'{data_file}.spectrum.{format}'
-    sample_rate = int(header['sample rate'])
-    center_f = int(header['frequency'])
-    capture_time = header['capture time']
+    with Pool(processes) as pool:
+        yield from pool.imap(
+            _generate_frames,
+            jobs,
+            chunksize=max(1, len(jobs) // (processes * 4)),
+        )
 
-    f, S = scipy.signal.periodogram(
-        [i_q for i_q, _ in data],
-        sample_rate,
-        'flattop',
-        scaling='spectrum',
-    )
 
-    fig, ax = plt.subplots()
-    plt.semilogy(center_f + f, np.sqrt(S))
-    plt.title(f'SR: {display_hz(sample_rate)} | {capture_time}')
-    plt.xlabel('frequency [Hz]')
-    plt.ylabel('Linear spectrum [V RMS]')
-    plt.savefig(image_file)
-    plt.close()
-    return image_file
+def _generate_frames(job):
+    return generate_frames(*job)
 
 
-def generate_video_from_images(
-    file_pattern,
+@contextmanager
+def video_stream(
+    filename,
     workbench,
+    size=FRAME_SIZE,
     framerate=5,
     fps=30,
     pixfmt='yuv420p',
     timeout=60*10,
 ):
-    filename = f'{uuid.uuid4()}.mp4'
+    """ Start a single ffmpeg process that encodes raw RGB frames written to
+    its stdin. Yields a callback that accepts each frame. Raises a ValueError
+    if no frames were written, since there is nothing to encode.
+    """
+    width, height = size
     command = f"""\
         ffmpeg \
+            -y \
+            -f rawvideo \
+            -pix_fmt rgb24 \
+            -s {width}x{height} \
             -framerate {framerate} \
-            -pattern_type glob \
-            -i '{file_pattern}' \
+            -i - \
             -c:v libx264 \
             -vf fps={fps} \
-            -pix_fmt {pixfmt}
+            -pix_fmt {pixfmt} \
             {filename}
         """
-    call(shlex.split(command), cwd=workbench, timeout=timeout)
-    return filename
+    process = Popen(
+        shlex.split(command),
+        cwd=workbench,
+        stdin=PIPE,
+        stdout=DEVNULL,
+    )
+
+    frames = 0
+
+    def write(frame):
+        nonlocal frames
+        process.stdin.write(frame)
+        frames += 1
+
+    try:
+        yield write
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg already exited, its return code says why.
+            pass
+
+        try:
+            process.wait(timeout=timeout)
+        finally:
+            if process.returncode is None:
+                process.kill()
+                process.wait()
+
+    if not frames:
+        raise ValueError(f'No frames were written to {filename}.')
+    if process.returncode:
+        raise CalledProcessError(process.returncode, command)
 
 
 def summarize_configuration_data(configuration, telescope_id, samples):
@@ -133,12 +280,27 @@ def summarize_configuration_data(configuration, telescope_id, samples):
         )
 
         logger.info(f'Getting files ({configuration.uuid})...')
-        files = get_files(samples, workbench)
+        jobs = []
+        for sample in samples:
+            # Only fetch the raw data for samples whose spectra aren't cached.
+            key = cache.make_key(sample.uuid, **SPECTRUM_PARAMETERS)
+            jobs.append((key, None if cache.touch(key) else get_file(sample, workbench)))
+
+        logger.info(f'Generating videos ({configuration.uuid})...')
+        fft_video_file = f'{uuid.uuid4()}.mp4'
+        spectrum_video_file = f'{uuid.uuid4()}.mp4'
+        with (
+            video_stream(fft_video_file, workbench) as write_fft,
+            video_stream(spectrum_video_file, workbench) as write_spectrum,
+        ):
+            for frames in map_frames(jobs):
+                if not frames:
+                    continue
+
+                fft_frame, spectrum_frame = frames
+                write_fft(fft_frame)
+                write_spectrum(spectrum_frame)
 
-        logger.info(f'Generating FFTs ({configuration.uuid})...')
-        for file in files:
-            generate_fft(file)
-        fft_video_file = generate_video_from_images('*fft.png', workbench)
         with open(os.path.join(workbench, fft_video_file), 'rb') as f:
             result.fft_video_file.save(
                 fft_video_file,
@@ -146,11 +308,6 @@ def summarize_configuration_data(configuration, telescope_id, samples):
             )
         result.save()
 
-        logger.info(f'Generating Spectra ({configuration.uuid})...')
-        for file in files:
-            generate_spectrum(file)
-        spectrum_video_file = generate_video_from_images('*spectrum.png', workbench)
-
         with open(os.path.join(workbench, spectrum_video_file), 'rb') as f:
             result.spectrum_video_file.save(
                 spectrum_video_file,
@@ -159,6 +316,152 @@ def summarize_configuration_data(configuration, telescope_id, samples):
         result.save()
 
 
+def get_power_spectrum(file, sample_rate, bins=None):
+    """ Compute the (centered) power spectral density of the given sample by
+    averaging the periodograms of each `bins`-sized segment. The file is
+    streamed so that memory use doesn't depend on the size of the sample.
+    """
+    if bins is None:
+        bins = settings.WATERFALL_BINS
+
+    total = np.zeros(bins, dtype=np.float64)
+    count = 0
+    for block in iter_samples(file, block_size=bins * 64):
+        segments = block.size // bins
+        if not segments:
+            continue
+
+        _, pxx = scipy.signal.welch(
+            block[:segments * bins],
+            sample_rate,
+            nperseg=bins,
+            noverlap=0,
+            return_onesided=False,
+        )
+        total += pxx * segments
+        count += segments
+
+    if not count:
+        return
+
+    return np.fft.fftshift(total / count).astype(np.float32)
+
+
+def generate_waterfall_preview(data, frequency, sample_rate):
+    width, height = FRAME_SIZE
+    fig = Figure(figsize=(width / FRAME_DPI, height / FRAME_DPI), dpi=FRAME_DPI)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    image = ax.imshow(
+        10 * np.log10(np.maximum(data, np.finfo(np.float32).tiny)),
+        aspect='auto',
+        origin='lower',
+        interpolation='nearest',
+        extent=(
+            frequency - sample_rate / 2,
+            frequency + sample_rate / 2,
+            0,
+            data.shape[0],
+        ),
+    )
+    fig.colorbar(image, ax=ax, label='Power [dB]')
+    ax.set_title(f'SR: {display_hz(sample_rate)} | {data.shape[0]} samples')
+    ax.set_xlabel('frequency [Hz]')
+    ax.set_ylabel('sample')
+
+    buffer = io.BytesIO()
+    canvas.print_png(buffer)
+    return buffer.getvalue()
+
+
+def _replace_file(field, filename, content):
+    previous = field.name
+    field.save(filename, ContentFile(content), save=False)
+    if previous:
+        field.storage.delete(previous)
+
+
+@shared_task(queue=Queue.processing, priority=Priority.default)
+def update_waterfall(sample_uuid):
+    """ Add the power spectrum of the given sample to the waterfall of its
+    configuration and schedule the waterfall to be re-rendered.
+    """
+    sample = Sample.objects.get(uuid=sample_uuid)
+    if not (sample.configuration_id and sample.sample_rate and sample.frequency):
+        logger.warning(f'Unable to add sample to waterfall ({sample_uuid}).')
+        return
+
+    key = cache.make_key(sample.uuid, kind='welch', bins=settings.WATERFALL_BINS)
+    if (cached := cache.get(key)) is not None:
+        row = cached['psd']
+    else:
+        with sample.data.open('rb') as f:
+            row = get_power_spectrum(f, sample.sample_rate)
+        if row is not None:
+            cache.put(key, {'psd': row})
+
+    if row is None:
+        logger.warning(f'Sample is too short for the waterfall ({sample_uuid}).')
+        return
+
+    with transaction.atomic():
+        result, _ = WaterfallResult.objects.get_or_create(
+            configuration_id=sample.configuration_id,
+            telescope_id=sample.telescope_id,
+        )
+        WaterfallRow.objects.update_or_create(
+            sample=sample,
+            defaults={
+                'result': result,
+                'captured_at': sample.captured_at or sample.created_at,
+                'data': row.astype(np.float32).tobytes(),
+            },
+        )
+
+        # Only the first new row since the last render schedules another, so
+        # a burst of samples is rendered once.
+        if WaterfallResult.objects.filter(id=result.id, is_stale=False).update(is_stale=True):
+            transaction.on_commit(lambda: render_waterfall.apply_async(
+                args=(result.uuid,),
+                countdown=settings.WATERFALL_RENDER_DELAY,
+            ))
+
+
+@shared_task(queue=Queue.processing, priority=Priority.low)
+def render_waterfall(result_uuid):
+    """ Assemble the rows of the waterfall in capture order and render the
+    array and preview.
+    """
+    result = WaterfallResult.objects.get(uuid=result_uuid)
+
+    # Rows added from here on schedule the next render.
+    WaterfallResult.objects.filter(id=result.id).update(is_stale=False)
+
+    rows = result.rows.values_list('data', flat=True)
+    count = rows.count()
+    if not count:
+        return
+
+    # Rows are streamed from the database rather than loaded all at once. Any
+    # added since they were counted are left to the next render.
+    data = np.zeros((count, settings.WATERFALL_BINS), dtype=np.float32)
+    for i, row in zip(range(count), rows.iterator()):
+        data[i] = np.frombuffer(row, dtype=np.float32)
+
+    # The spectra are plotted at the tuning of the latest sample.
+    sample = result.rows.select_related('sample').last().sample
+    buffer = io.BytesIO()
+    np.save(buffer, data)
+    _replace_file(result.data_file, f'{result.uuid}.waterfall.npy', buffer.getvalue())
+    _replace_file(
+        result.preview_file,
+        f'{result.uuid}.waterfall.png',
+        generate_waterfall_preview(data, sample.frequency, sample.sample_rate),
+    )
+    result.sample_count = data.shape[0]
+    result.save(update_fields=('data_file', 'preview_file', 'sample_count', 'updated_at'))
+
+
 @shared_task(queue=Queue.default, priority=Priority.default)
 def summarize_observation_configuration(configuration_uuid):
     configuration = Configuration.objects.get(uuid=configuration_uuid)
@@ -170,7 +473,11 @@ def summarize_observation_configuration(configuration_uuid):
         return
 
     samples_by_telescope = {
-        telescope.id: configuration.samples.filter(telescope=telescope).order_by('captured_at')
+        telescope.id: (
+            configuration.samples
+            .filter(telescope=telescope)
+            .order_by('captured_at', 'id')
+        )
         for telescope in configuration.observation.telescopes.all()
         if configuration.samples.filter(telescope=telescope).exists()
     }
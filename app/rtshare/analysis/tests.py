@@ -1,3 +1,138 @@
-from django.test import TestCase  # noqa
+from datetime import timedelta
+import os.path
+import tempfile
+import uuid
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files import File
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+import numpy as np
+
+from observations.models import Configuration, Observation, Sample
+from rtshare.utils import iqd
+from telescope.models import Telescope
+from . import cache
+from .tasks import FRAME_SIZE, SPECTRUM_PARAMETERS, generate_frames, update_waterfall
+
+
+FIXTURES_DIR = os.path.join(settings.BASE_DIR, 'rtshare', 'fixtures')
+GZ_FIXTURES_DIR = os.path.join(settings.BASE_DIR, 'telescope', 'fixtures')
+
+
+class IQDTest(SimpleTestCase):
+
+    def test_can_decode_samples(self):
+        with open(os.path.join(GZ_FIXTURES_DIR, 'sample.iqd.gz'), 'rb') as f:
+            header = iqd.get_header(f)
+            iq, magnitude = iqd.get_samples(f)
+
+        self.assertEqual(header['sample rate'], '2048000')
+        self.assertEqual(iq.dtype, np.complex64)
+        self.assertEqual(magnitude.dtype, np.float32)
+        self.assertEqual(iq.size, magnitude.size)
+        self.assertTrue(np.all(np.abs(iq.real) <= 1))
+        self.assertTrue(np.all(np.abs(iq.imag) <= 1))
+        np.testing.assert_allclose(magnitude, np.abs(iq))
+
+    def test_legacy_data_matches_samples(self):
+        with open(os.path.join(FIXTURES_DIR, 'sample.iqd'), 'rb') as f:
+            iq, magnitude = iqd.get_samples(f)
+            data = iqd.get_data(f)
+
+        self.assertEqual(len(data), iq.size)
+        i_q, v = data[0]
+        self.assertAlmostEqual(i_q, complex(iq[0]), places=6)
+        self.assertAlmostEqual(v, float(magnitude[0]), places=6)
+
+    def test_can_stream_samples_in_blocks(self):
+        with open(os.path.join(GZ_FIXTURES_DIR, 'sample.iqd.gz'), 'rb') as f:
+            blocks = list(iqd.iter_samples(f, block_size=1000))
+            iq, _ = iqd.get_samples(f)
+
+        self.assertEqual([block.size for block in blocks], [1000] * 4 + [96])
+        np.testing.assert_array_equal(np.concatenate(blocks), iq)
+
+
+class FrameTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(ANALYSIS_CACHE_PATH=directory))
+
+    def test_can_rasterize_frames(self):
+        width, height = FRAME_SIZE
+        key = cache.make_key(uuid.uuid4())
+        frames = generate_frames(key, os.path.join(GZ_FIXTURES_DIR, 'sample.iqd.gz'))
+        for frame in frames:
+            self.assertEqual(len(frame), width * height * 3)
+
+        # Once cached, frames no longer need the raw data.
+        self.assertEqual(generate_frames(key, None), frames)
+        spectra = cache.get(key)
+        self.assertLessEqual(spectra['spectrum'].size, SPECTRUM_PARAMETERS['bins'])
+
+
+class CacheTest(SimpleTestCase):
+
+    def test_evicts_least_recently_used_entries(self):
+        arrays = {'values': np.zeros(1024, dtype=np.float32)}
+        with tempfile.TemporaryDirectory() as directory:
+            first, second = cache.make_key('a', bins=1), cache.make_key('a', bins=2)
+            self.assertNotEqual(first, second)
+
+            cache.put(first, arrays, directory=directory)
+            os.utime(os.path.join(directory, f'{first}.npz'), (0, 0))
+            cache.put(second, arrays, directory=directory, max_size=5000)
+
+            self.assertIsNone(cache.get(first, directory=directory))
+            np.testing.assert_array_equal(
+                cache.get(second, directory=directory)['values'],
+                arrays['values'],
+            )
+
+
+class WaterfallTest(TestCase):
+
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(ANALYSIS_CACHE_PATH=directory))
+        self.telescope = Telescope.objects.create(name='Test Scope')
+        self.observation = Observation.objects.create(name='Test Observation #1')
+        self.configuration = Configuration.objects.create(observation=self.observation)
+
+    def create_sample(self, captured_at=None):
+        with open(os.path.join(GZ_FIXTURES_DIR, 'sample.iqd.gz'), 'rb') as f:
+            return Sample.objects.create(
+                observation=self.observation,
+                telescope=self.telescope,
+                configuration=self.configuration,
+                frequency=1_420_000_000,
+                sample_rate=2_048_000,
+                captured_at=captured_at,
+                data=File(f, name='sample.iqd.gz'),
+            )
+
+    def test_can_append_samples_to_waterfall(self):
+        now = timezone.now()
+        later = self.create_sample(captured_at=now)
+        earlier = self.create_sample(captured_at=now - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            update_waterfall(later.uuid)
+            update_waterfall(earlier.uuid)
+
+        # Both rows are rendered together.
+        self.assertEqual(len(callbacks), 1)
+
+        result = self.configuration.waterfall_results.get()
+        self.assertEqual(result.sample_count, 2)
+        self.assertFalse(result.is_stale)
+        self.assertTrue(result.preview_file)
+        self.assertEqual(
+            list(result.rows.values_list('sample', flat=True)),
+            [earlier.id, later.id],
+        )
+
+        data = np.load(result.data_file.path, mmap_mode='r')
+        self.assertEqual(data.shape, (2, settings.WATERFALL_BINS))
+        self.assertEqual(data.dtype, np.float32)
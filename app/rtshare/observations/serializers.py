@@ -74,9 +74,20 @@ class SampleSerializer(serializers.ModelSerializer):
         except Exception:
             return None
 
-    def create(self, validated_data):
-        # Using the data file, parse out the header data for the sample and
-        # use that to update the record.
+    def get_sample_data(self, validated_data, related=None):
+        """ Using the data file, parse out the header data for the sample and
+        use that to fill in the rest of the record. Related records are looked
+        up through the `related` dict when given, so a batch of samples only
+        fetches each of them once.
+        """
+        if related is None:
+            related = {}
+
+        def _get(model, id):
+            if (model, id) not in related:
+                related[(model, id)] = model.objects.get(id=id)
+            return related[(model, id)]
+
         headers = iqd.get_header(validated_data['data'])
         telescope_id, observation_id, configuration_id = [
             int(value)
@@ -86,12 +97,15 @@ class SampleSerializer(serializers.ModelSerializer):
         if validated_data['telescope'].id != telescope_id:
             raise ValueError('Invalid telescope id for the given endpoint.')
 
-        validated_data['telescope'] = Telescope.objects.get(id=telescope_id)
-        validated_data['observation'] = Observation.objects.get(id=observation_id)
-        validated_data['configuration'] = Configuration.objects.get(id=configuration_id)
+        validated_data['telescope'] = _get(Telescope, telescope_id)
+        validated_data['observation'] = _get(Observation, observation_id)
+        validated_data['configuration'] = _get(Configuration, configuration_id)
 
         for source, mapping in self.mappings.items():
             destination, transform = mapping['key'], mapping['transform']
             validated_data[destination] = self._get_value(headers, source, transform)
 
-        return super().create(validated_data)
+        return validated_data
+
+    def create(self, validated_data):
+        return super().create(self.get_sample_data(validated_data))
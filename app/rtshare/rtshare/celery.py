@@ -60,6 +60,12 @@ app.conf.beat_schedule = {
         'schedule': timedelta(minutes=5),
     },
 
+    # Occasionally clean up uploads that were abandoned part way through.
+    'expire_upload_sessions': {
+        'task': 'telescope.tasks.expire_upload_sessions',
+        'schedule': timedelta(hours=1),
+    },
+
     # Occasionally check to see if new observations require summarization.
     'summarize_completed_observations_if_needed': {
         'task': 'analysis.tasks.summarize_completed_observations_if_needed',
@@ -264,6 +264,59 @@ LOGGING = {
     },
 }
 
+# Analysis Settings
+
+# Frames are rendered across this many processes per analysis task.
+ANALYSIS_PROCESSES = int(os.environ.get(
+    'ANALYSIS_PROCESSES',
+    1,
+))
+
+# Derived per-sample products (spectra, etc) are cached here between runs, so
+# this should outlive restarts of the workers.
+ANALYSIS_CACHE_PATH = os.environ.get(
+    'ANALYSIS_CACHE_PATH',
+    os.path.join(MEDIA_ROOT, 'analysis-cache'),
+)
+ANALYSIS_CACHE_SIZE = int(os.environ.get(
+    'ANALYSIS_CACHE_SIZE',
+    20 * 2**30,
+))
+
+# The number of frequency bins in each row of a waterfall.
+WATERFALL_BINS = int(os.environ.get(
+    'WATERFALL_BINS',
+    1024,
+))
+# Waterfalls are re-rendered at most this often (in seconds) as rows arrive.
+WATERFALL_RENDER_DELAY = int(os.environ.get(
+    'WATERFALL_RENDER_DELAY',
+    60,
+))
+
+# Upload Settings
+
+# Chunks of resumable uploads are collected here until they are assembled.
+# This needs to outlive restarts of the server, or uploads start over.
+UPLOAD_SESSION_PATH = os.environ.get(
+    'UPLOAD_SESSION_PATH',
+    os.path.join(MEDIA_ROOT, 'uploads'),
+)
+UPLOAD_CHUNK_SIZE = int(os.environ.get(
+    'UPLOAD_CHUNK_SIZE',
+    2**20,
+))
+# Unfinished uploads are discarded after this long (in seconds) without a chunk.
+UPLOAD_SESSION_EXPIRY = int(os.environ.get(
+    'UPLOAD_SESSION_EXPIRY',
+    24 * 60 * 60,
+))
+# The total size (in bytes) of the files in a single tar batch of samples.
+UPLOAD_BATCH_MAX_SIZE = int(os.environ.get(
+    'UPLOAD_BATCH_MAX_SIZE',
+    2**30,
+))
+
 try:
     CELERY_BROKER_URL = os.environ['CELERY_BROKER_URL']
 except KeyError:
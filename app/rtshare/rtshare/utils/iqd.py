@@ -1,22 +1,45 @@
 import base64
 import gzip
-import math
+
+import numpy as np
 
 
 COMMENT = '#'
 SEPARATOR = ':'
 
+# Raw samples are unsigned 8-bit values centered on 127.5.
+SAMPLE_SCALE = 255 / 2
 
-def get_header(file):
+# The number of IQ samples yielded per block when streaming a payload.
+BLOCK_SIZE = 2**16
+
+_COMMENT = COMMENT.encode('utf-8')
+
+
+def _iter_lines(file):
+    """ Lazily yield each raw line in the file, decompressing as we go. Only
+    as much of the file as has been consumed is ever read into memory.
+    """
     if file.name.endswith('.gz'):
-        content = gzip.decompress(file.read())
-        lines = content.decode('utf-8').split('\n')
+        stream = gzip.GzipFile(fileobj=file, mode='rb')
     else:
-        lines = file
+        stream = file
+
+    for line in stream:
+        yield line if isinstance(line, bytes) else line.encode('utf-8')
+
+
+def _decode_block(raw):
+    values = raw.astype(np.float32)
+    values /= SAMPLE_SCALE
+    values -= 1
+    return values.view(np.complex64)
 
+
+def get_header(file):
     headers = []
-    for line in lines:
-        line = line.strip()
+    for line in _iter_lines(file):
+        line = line.decode('utf-8').strip()
 
         if line.startswith(COMMENT):
             headers.append(line[1:].split(SEPARATOR, 1))
@@ -34,37 +57,67 @@ def get_header(file):
     }
 
 
-def get_data(file, as_complex=True):
-    if file.name.endswith('.gz'):
-        content = gzip.decompress(file.read())
-        lines = content.decode('utf-8').split('\n')
-    else:
-        lines = file
+def iter_samples(file, block_size=BLOCK_SIZE):
+    """ Stream the IQ payload of the given file as complex64 blocks of
+    `block_size` samples (the final block may be shorter).
+
+    Peak memory is bounded by the block size regardless of the file size.
+    """
+    block_bytes = 2 * block_size
+    # Base64 decodes in 4 character quanta, each holding 3 bytes.
+    chunk_chars = 4 * -(-block_bytes // 3)
+
+    encoded = bytearray()
+    pending = bytearray()
+
+    def _drain(final=False):
+        while len(pending) >= block_bytes:
+            yield _decode_block(np.frombuffer(pending, np.uint8, block_bytes).copy())
+            del pending[:block_bytes]
+
+        if final and (size := len(pending) - (len(pending) % 2)):
+            # Drop any trailing byte that doesn't belong to a full I/Q pair.
+            yield _decode_block(np.frombuffer(pending, np.uint8, size).copy())
+            pending.clear()
+
+    for line in _iter_lines(file):
+        line = line.strip()
+        if not line or line.startswith(_COMMENT):
+            continue
+
+        encoded += line
+        if len(encoded) >= chunk_chars:
+            size = len(encoded) - (len(encoded) % 4)
+            pending += base64.b64decode(bytes(encoded[:size]))
+            del encoded[:size]
+            yield from _drain()
+
+    if encoded:
+        pending += base64.b64decode(bytes(encoded))
+    yield from _drain(final=True)
 
-    encoded_data = ''.join([
-        line for line in lines
-        if not line.startswith('#')
-    ])
     file.seek(0)
 
-    data = [
-        int(oct(b), 8)
-        for b in base64.b64decode(encoded_data)
-    ]
-
-    def _get_entries():
-        for i_raw, q_raw in zip(data[0::1], data[1::2]):
-            i, q = (
-                (i_raw / (255 / 2)) - 1,
-                (q_raw / (255 / 2)) - 1,
-            )
-            # This gives Amplitude, Power (which is more useful) is just I^2 + Q^2.
-            # dB is then log10(P)
-            # https://dsp.stackexchange.com/questions/19615/converting-raw-i-q-to-db
-            v = math.sqrt(i**2 + q**2)
-            if as_complex:
-                yield complex(i, q), v
-            else:
-                yield i, q, v
-
-    return list(_get_entries())
+
+def get_samples(file):
+    """ Decode the IQ payload of the given file into NumPy arrays.
+
+    Returns a tuple of the complex64 IQ samples and their float32 magnitudes.
+    """
+    blocks = list(iter_samples(file))
+    iq = np.concatenate(blocks) if blocks else np.empty(0, np.complex64)
+
+    # This gives Amplitude, Power (which is more useful) is just I^2 + Q^2.
+    # dB is then log10(P)
+    # https://dsp.stackexchange.com/questions/19615/converting-raw-i-q-to-db
+    magnitude = np.abs(iq)
+    return iq, magnitude
+
+
+def get_data(file, as_complex=True):
+    iq, magnitude = get_samples(file)
+
+    if as_complex:
+        return list(zip(iq.tolist(), magnitude.tolist()))
+    else:
+        return list(zip(iq.real.tolist(), iq.imag.tolist(), magnitude.tolist()))
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Telescope
+from .models import SpectrumFile, Telescope, UploadSession
 
 
 @admin.register(Telescope)
@@ -30,3 +30,52 @@ class TelescopeAdmin(admin.ModelAdmin):
         'name',
         'description',
     )
+
+
+@admin.register(SpectrumFile)
+class SpectrumFileAdmin(admin.ModelAdmin):
+
+    list_display = (
+        'id',
+        'name',
+        'telescope',
+        'created_at',
+    )
+
+    readonly_fields = (
+        'uuid',
+        'created_at',
+        'updated_at',
+    )
+
+    list_filter = (
+        'telescope',
+    )
+
+    search_fields = (
+        'identifier',
+    )
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+
+    list_display = (
+        'id',
+        'name',
+        'telescope',
+        'offset',
+        'size',
+        'completed_at',
+        'created_at',
+    )
+
+    readonly_fields = (
+        'uuid',
+        'created_at',
+        'updated_at',
+    )
+
+    list_filter = (
+        'telescope',
+    )
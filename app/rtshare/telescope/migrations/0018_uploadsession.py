@@ -0,0 +1,37 @@
+# Generated by Django 5.0.8 on 2026-10-18 07:52
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('observations', '0003_configuration_processing_state'),
+        ('telescope', '0017_delete_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The exact time when a record was created.')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The exact time when a record was last updated.')),
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('uuid', models.UUIDField(default=uuid.uuid4, help_text='The unique identifier for this record.', unique=True)),
+                ('name', models.CharField(help_text='The name of the file being uploaded.', max_length=256)),
+                ('size', models.PositiveBigIntegerField(help_text='The total size of the file (in bytes).')),
+                ('checksum', models.CharField(help_text='The SHA-256 digest of the whole file.', max_length=64)),
+                ('chunk_size', models.PositiveIntegerField(help_text='The maximum size of each chunk (in bytes).')),
+                ('offset', models.PositiveBigIntegerField(default=0, help_text='The number of bytes received and verified so far.')),
+                ('completed_at', models.DateTimeField(blank=True, default=None, help_text='The exact time when the file was assembled into a sample.', null=True)),
+                ('sample', models.OneToOneField(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='observations.sample')),
+                ('telescope', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='telescope.telescope')),
+            ],
+            options={
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
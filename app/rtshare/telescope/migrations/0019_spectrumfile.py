@@ -0,0 +1,44 @@
+# Generated by Django 5.0.8 on 2026-10-18 08:11
+
+import django.core.files.storage
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telescope', '0018_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, default=None, help_text='The exact time when the file was assembled.', null=True),
+        ),
+        migrations.CreateModel(
+            name='SpectrumFile',
+            fields=[
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The exact time when a record was created.')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The exact time when a record was last updated.')),
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('uuid', models.UUIDField(default=uuid.uuid4, help_text='The unique identifier for this record.', unique=True)),
+                ('identifier', models.CharField(db_index=True, help_text='The identifier of the reading that the file belongs to.', max_length=256)),
+                ('name', models.CharField(help_text='The name of the file as sent by the telescope.', max_length=256)),
+                ('data', models.FileField(storage=django.core.files.storage.FileSystemStorage(), upload_to='starsweep/spectra/')),
+                ('telescope', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spectrum_files', to='telescope.telescope')),
+            ],
+            options={
+                'ordering': ('-created_at',),
+                'unique_together': {('telescope', 'name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='spectrum_file',
+            field=models.OneToOneField(blank=True, default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='telescope.spectrumfile'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.8 on 2026-10-18 08:32
+
+from django.db import migrations, models
+
+
+def set_kind(apps, schema_editor):
+    UploadSession = apps.get_model('telescope', 'UploadSession')
+    db_alias = schema_editor.connection.alias
+    UploadSession.objects.using(db_alias).filter(
+        spectrum_file__isnull=False,
+    ).update(kind='spectrum_file')
+
+
+def no_op(apps, schema_editor):
+    pass
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telescope', '0019_spectrumfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='kind',
+            field=models.CharField(choices=[('sample', 'Sample'), ('spectrum_file', 'Spectrum File')], default='sample', help_text='What the file is assembled into once it has been received.', max_length=30),
+        ),
+        migrations.RunPython(
+            set_kind,
+            no_op,
+        ),
+    ]
@@ -1,4 +1,5 @@
 from datetime import timedelta
+import os.path
 
 from django.conf import settings
 from django.core.files.storage import storages
@@ -164,3 +165,167 @@ class Telescope(BaseModel):
             .filter(observation__telescopes=self)
             .filter(observation__end_at__gte=yesterday)
         )
+
+
+class SpectrumFile(BaseModel):
+    """ A file of a spectrum that a telescope integrated itself: its config,
+    data or plot. The files of one reading share its `identifier`.
+    """
+
+    EXTENSIONS = ('.dat', '.json', '.png')
+
+    telescope = models.ForeignKey(
+        'telescope.Telescope',
+        related_name='spectrum_files',
+        on_delete=models.CASCADE,
+    )
+
+    identifier = models.CharField(
+        max_length=256,
+        db_index=True,
+        help_text=(
+            'The identifier of the reading that the file belongs to.'
+        )
+    )
+
+    name = models.CharField(
+        max_length=256,
+        help_text=(
+            'The name of the file as sent by the telescope.'
+        )
+    )
+
+    data = models.FileField(
+        storage=get_storage(),
+        upload_to='starsweep/spectra/',
+    )
+
+    class Meta:
+        ordering = ('-created_at',)
+        unique_together = ('telescope', 'name')
+
+    def __str__(self):
+        return self.name
+
+
+class UploadSession(BaseModel):
+    """ A file being uploaded by a telescope in fixed-size chunks. The
+    received bytes are appended to a local partial file as each chunk is
+    verified so that an interrupted transfer resumes from `offset`. Once
+    every byte has arrived and the file matches its checksum it is assembled
+    into a `Sample` (or a `SpectrumFile`).
+    """
+
+    class Kind:
+        SAMPLE = 'sample'
+        SPECTRUM_FILE = 'spectrum_file'
+
+        choices = (
+            (SAMPLE, 'Sample'),
+            (SPECTRUM_FILE, 'Spectrum File'),
+        )
+
+    telescope = models.ForeignKey(
+        'telescope.Telescope',
+        related_name='upload_sessions',
+        on_delete=models.CASCADE,
+    )
+
+    kind = models.CharField(
+        max_length=30,
+        choices=Kind.choices,
+        default=Kind.SAMPLE,
+        help_text=(
+            'What the file is assembled into once it has been received.'
+        )
+    )
+
+    sample = models.OneToOneField(
+        'observations.Sample',
+        related_name='upload_session',
+        on_delete=models.SET_NULL,
+        default=None,
+        null=True,
+        blank=True,
+    )
+
+    spectrum_file = models.OneToOneField(
+        'telescope.SpectrumFile',
+        related_name='upload_session',
+        on_delete=models.SET_NULL,
+        default=None,
+        null=True,
+        blank=True,
+    )
+
+    name = models.CharField(
+        max_length=256,
+        help_text=(
+            'The name of the file being uploaded.'
+        )
+    )
+
+    size = models.PositiveBigIntegerField(
+        help_text=(
+            'The total size of the file (in bytes).'
+        )
+    )
+
+    checksum = models.CharField(
+        max_length=64,
+        help_text=(
+            'The SHA-256 digest of the whole file.'
+        )
+    )
+
+    chunk_size = models.PositiveIntegerField(
+        help_text=(
+            'The maximum size of each chunk (in bytes).'
+        )
+    )
+
+    offset = models.PositiveBigIntegerField(
+        default=0,
+        help_text=(
+            'The number of bytes received and verified so far.'
+        )
+    )
+
+    completed_at = models.DateTimeField(
+        default=None,
+        blank=True,
+        null=True,
+        help_text=(
+            'The exact time when the file was assembled.'
+        ),
+    )
+
+    class Meta:
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'{self.name} ({self.offset}/{self.size})'
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_SESSION_PATH, f'{self.uuid}.part')
+
+    @property
+    def is_received(self):
+        return self.offset == self.size
+
+    @property
+    def has_partial_file(self):
+        return os.path.exists(self.path)
+
+    def create_partial_file(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        open(self.path, 'wb').close()
+
+    def restart(self):
+        """ Discard whatever has been received and start over from the first
+        chunk (e.g. when the partial file has gone missing).
+        """
+        self.create_partial_file()
+        self.offset = 0
+        self.save(update_fields=('offset', 'updated_at'))
@@ -1,11 +1,15 @@
+from datetime import timedelta
 import logging
+import os
 
 from celery import group
+from django.conf import settings
+from django.utils import timezone
 from django_eventstream import send_event
 
 
 from rtshare.celery import shared_task, Queue, Priority
-from .models import Telescope
+from .models import Telescope, UploadSession
 
 
 logger = logging.getLogger(__name__)
@@ -25,3 +29,19 @@ def ping_all():
         for telescope in qs
     ])
     workflow.delay()
+
+
+@shared_task(queue=Queue.management, priority=Priority.low)
+def expire_upload_sessions():
+    """ Delete unfinished uploads that haven't received a chunk in a while,
+    along with their partial files.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_EXPIRY)
+    qs = UploadSession.objects.filter(completed_at=None, updated_at__lt=cutoff)
+    for session in qs:
+        logger.info(f'Expiring upload session {session.uuid} ({session})')
+        try:
+            os.remove(session.path)
+        except FileNotFoundError:
+            pass
+    qs.delete()
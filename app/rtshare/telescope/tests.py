@@ -1,10 +1,22 @@
+from datetime import timedelta
+import hashlib
+import io
 import os.path
+import tarfile
+import tempfile
+from unittest import mock
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
-from observations.models import Configuration, Observation
-from .models import Telescope
+from observations.models import Configuration, Observation, Sample
+from .models import SpectrumFile, Telescope, UploadSession
+from .tasks import expire_upload_sessions
 
 
 FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
@@ -52,3 +64,247 @@ class APITest(TestCase):
                 data={'data': file},
             )
         self.assertEqual(response.status_code, 201)
+
+    def test_can_upload_spectrum_files(self):
+        self.client.login(**self.credentials)
+        url = f'/api/telescope/{self.telescope.id}/transmit/files'
+
+        def post(name, content):
+            return self.client.post(url, data={'data': SimpleUploadedFile(name, content)})
+
+        self.assertEqual(post('spectrum.json', b'{}').status_code, 201)
+        # Retrying the same file replaces it instead of adding a duplicate.
+        self.assertEqual(post('spectrum.json', b'{"retry": true}').status_code, 200)
+        self.assertEqual(post('spectrum.iqd.gz', b'\x1f\x8b').status_code, 400)
+
+        spectrum_file = SpectrumFile.objects.get(telescope=self.telescope)
+        self.assertEqual(spectrum_file.identifier, 'spectrum')
+        self.assertEqual(spectrum_file.data.read(), b'{"retry": true}')
+
+    def test_can_upload_batches(self):
+        self.client.login(**self.credentials)
+        with (
+            open(os.path.join(FIXTURES_DIR, 'sample.iqd.gz'), 'rb') as first,
+            open(os.path.join(FIXTURES_DIR, 'sample.iqd.gz'), 'rb') as second,
+        ):
+            response = self.client.post(
+                f'/api/telescope/{self.telescope.id}/transmit/batch',
+                data={'data': [first, second, io.BytesIO(b'')]},
+            )
+
+        self.assertEqual(response.status_code, 207)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['created', 'created', 'error'])
+        self.assertEqual(Sample.objects.count(), 2)
+
+    def test_can_upload_tar_batches(self):
+        self.client.login(**self.credentials)
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar:
+            for name in ('first.iqd.gz', 'second.iqd.gz'):
+                tar.add(os.path.join(FIXTURES_DIR, 'sample.iqd.gz'), arcname=name)
+
+        response = self.client.post(
+            f'/api/telescope/{self.telescope.id}/transmit/batch',
+            data=archive.getvalue(),
+            content_type='application/x-tar',
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(Sample.objects.filter(telescope=self.telescope).count(), 2)
+
+        with override_settings(UPLOAD_BATCH_MAX_SIZE=len(archive.getvalue()) // 4):
+            response = self.client.post(
+                f'/api/telescope/{self.telescope.id}/transmit/batch',
+                data=archive.getvalue(),
+                content_type='application/x-tar',
+            )
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(Sample.objects.filter(telescope=self.telescope).count(), 2)
+
+    def test_failed_batches_leave_no_files(self):
+        self.client.login(**self.credentials)
+        bulk_create = Sample.objects.bulk_create
+        stored = []
+
+        def fail_after_storing(samples):
+            bulk_create(samples)
+            stored.extend(sample.data.name for sample in samples)
+            raise DatabaseError('Simulated failure')
+
+        with (
+            open(os.path.join(FIXTURES_DIR, 'sample.iqd.gz'), 'rb') as file,
+            mock.patch.object(Sample.objects, 'bulk_create', fail_after_storing),
+            self.assertRaises(DatabaseError),
+            self.assertLogs('django.request', 'ERROR'),
+        ):
+            self.client.post(
+                f'/api/telescope/{self.telescope.id}/transmit/batch',
+                data={'data': [file]},
+            )
+
+        self.assertEqual(Sample.objects.count(), 0)
+        self.assertEqual(len(stored), 1)
+        self.assertFalse(default_storage.exists(stored[0]))
+
+    def test_can_resume_chunked_uploads(self):
+        self.client.login(**self.credentials)
+        with open(os.path.join(FIXTURES_DIR, 'sample.iqd.gz'), 'rb') as f:
+            content = f.read()
+        url = f'/api/telescope/{self.telescope.id}/transmit/uploads'
+        metadata = {
+            'name': 'sample.iqd.gz',
+            'size': len(content),
+            'checksum': hashlib.sha256(content).hexdigest(),
+        }
+
+        def put_chunk(session, start, end, checksum=None):
+            chunk = content[start:end]
+            return self.client.put(
+                f'{url}/{session["id"]}',
+                data=chunk,
+                content_type='application/octet-stream',
+                headers={
+                    'Content-Range': f'bytes {start}-{end - 1}/{len(content)}',
+                    'X-Chunk-SHA256': checksum or hashlib.sha256(chunk).hexdigest(),
+                },
+            )
+
+        chunk_size = len(content) // 2 + 1
+        with (
+            tempfile.TemporaryDirectory() as directory,
+            override_settings(UPLOAD_SESSION_PATH=directory, UPLOAD_CHUNK_SIZE=chunk_size),
+        ):
+            session = self.client.post(url, data=metadata).json()
+            self.assertEqual(put_chunk(session, 0, chunk_size).json()['offset'], chunk_size)
+
+            # Corrupt and out of order chunks are rejected.
+            response = put_chunk(session, chunk_size, len(content), checksum='0' * 64)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(put_chunk(session, 0, chunk_size).status_code, 409)
+
+            # Starting the same upload again resumes where it left off.
+            session = self.client.post(url, data=metadata).json()
+            self.assertEqual(session['offset'], chunk_size)
+            put_chunk(session, chunk_size, len(content))
+
+            response = self.client.post(f'{url}/{session["id"]}/complete')
+            self.assertEqual(response.status_code, 201)
+
+            # Uploading the same file again doesn't duplicate the sample.
+            session = self.client.post(url, data=metadata).json()
+            self.assertEqual(session['sample'], response.json()['sample'])
+            self.assertEqual(
+                self.client.post(f'{url}/{session["id"]}/complete').status_code,
+                200,
+            )
+
+        sample = Sample.objects.get(uuid=response.json()['sample'])
+        self.assertEqual(sample.data.read(), content)
+        self.assertEqual(Sample.objects.count(), 1)
+
+    def test_keeps_uploads_apart_by_endpoint_and_name(self):
+        self.client.login(**self.credentials)
+        samples_url = f'/api/telescope/{self.telescope.id}/transmit/uploads'
+        files_url = f'/api/telescope/{self.telescope.id}/transmit/files/uploads'
+        content = b'{}'
+        metadata = {
+            'name': 'spectrum.json',
+            'size': len(content),
+            'checksum': hashlib.sha256(content).hexdigest(),
+        }
+
+        with (
+            tempfile.TemporaryDirectory() as directory,
+            override_settings(UPLOAD_SESSION_PATH=directory),
+        ):
+            session = self.client.post(files_url, data=metadata).json()
+            self.assertEqual(session['kind'], 'spectrum_file')
+
+            # The same bytes sent elsewhere, or under another name, are
+            # separate uploads.
+            other = self.client.post(samples_url, data=metadata).json()
+            self.assertNotEqual(other['id'], session['id'])
+            self.assertEqual(other['kind'], 'sample')
+            renamed = self.client.post(
+                files_url,
+                data={**metadata, 'name': 'other.json'},
+            ).json()
+            self.assertNotEqual(renamed['id'], session['id'])
+
+            # Chunks and completion only go through the endpoint that started it.
+            headers = {
+                'Content-Range': f'bytes 0-{len(content) - 1}/{len(content)}',
+                'X-Chunk-SHA256': hashlib.sha256(content).hexdigest(),
+            }
+            response = self.client.put(
+                f'{samples_url}/{session["id"]}',
+                data=content,
+                content_type='application/octet-stream',
+                headers=headers,
+            )
+            self.assertEqual(response.status_code, 404)
+            response = self.client.put(
+                f'{files_url}/{session["id"]}',
+                data=content,
+                content_type='application/octet-stream',
+                headers=headers,
+            )
+            self.assertEqual(response.status_code, 200)
+
+            response = self.client.post(f'{samples_url}/{session["id"]}/complete')
+            self.assertEqual(response.status_code, 404)
+            response = self.client.post(f'{files_url}/{session["id"]}/complete')
+            self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(SpectrumFile.objects.get().name, 'spectrum.json')
+        self.assertFalse(Sample.objects.exists())
+
+    def test_can_restart_lost_uploads(self):
+        self.client.login(**self.credentials)
+        url = f'/api/telescope/{self.telescope.id}/transmit/uploads'
+        content = b'0123456789'
+        metadata = {
+            'name': 'sample.iqd.gz',
+            'size': len(content),
+            'checksum': hashlib.sha256(content).hexdigest(),
+        }
+
+        with (
+            tempfile.TemporaryDirectory() as directory,
+            override_settings(UPLOAD_SESSION_PATH=directory, UPLOAD_CHUNK_SIZE=5),
+        ):
+            session = self.client.post(url, data=metadata).json()
+            self.client.put(
+                f'{url}/{session["id"]}',
+                data=content[:5],
+                content_type='application/octet-stream',
+                headers={
+                    'Content-Range': f'bytes 0-4/{len(content)}',
+                    'X-Chunk-SHA256': hashlib.sha256(content[:5]).hexdigest(),
+                },
+            )
+            upload = UploadSession.objects.get(uuid=session['id'])
+            os.remove(upload.path)
+
+            response = self.client.put(
+                f'{url}/{session["id"]}',
+                data=content[5:],
+                content_type='application/octet-stream',
+                headers={
+                    'Content-Range': f'bytes 5-9/{len(content)}',
+                    'X-Chunk-SHA256': hashlib.sha256(content[5:]).hexdigest(),
+                },
+            )
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()['offset'], 0)
+            self.assertTrue(os.path.exists(upload.path))
+
+            # Abandoned uploads are cleaned up after a while.
+            UploadSession.objects.update(
+                updated_at=timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_EXPIRY + 1),
+            )
+            expire_upload_sessions()
+            self.assertFalse(UploadSession.objects.exists())
+            self.assertFalse(os.path.exists(upload.path))
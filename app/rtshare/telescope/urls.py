@@ -49,4 +49,44 @@ urlpatterns = [
         views.SampleDataTransmitView.as_view(),
         name='observation.transmit',
     ),
+    path(
+        'api/telescope/<int:pk>/transmit/batch',
+        views.SampleBatchTransmitView.as_view(),
+        name='observation.transmit-batch',
+    ),
+    path(
+        'api/telescope/<int:pk>/transmit/uploads',
+        views.UploadSessionCreateView.as_view(),
+        name='observation.upload-create',
+    ),
+    path(
+        'api/telescope/<int:pk>/transmit/uploads/<uuid:upload_id>',
+        views.UploadSessionView.as_view(),
+        name='observation.upload',
+    ),
+    path(
+        'api/telescope/<int:pk>/transmit/uploads/<uuid:upload_id>/complete',
+        views.UploadSessionCompleteView.as_view(),
+        name='observation.upload-complete',
+    ),
+    path(
+        'api/telescope/<int:pk>/transmit/files',
+        views.SpectrumFileTransmitView.as_view(),
+        name='observation.transmit-file',
+    ),
+    path(
+        'api/telescope/<int:pk>/transmit/files/uploads',
+        views.SpectrumFileUploadSessionCreateView.as_view(),
+        name='observation.file-upload-create',
+    ),
+    path(
+        'api/telescope/<int:pk>/transmit/files/uploads/<uuid:upload_id>',
+        views.SpectrumFileUploadSessionView.as_view(),
+        name='observation.file-upload',
+    ),
+    path(
+        'api/telescope/<int:pk>/transmit/files/uploads/<uuid:upload_id>/complete',
+        views.SpectrumFileUploadSessionCompleteView.as_view(),
+        name='observation.file-upload-complete',
+    ),
 ]
@@ -1,15 +1,29 @@
+import hashlib
+import os
+import os.path
+import re
+import shutil
+import tarfile
+
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files import File
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from django.db import transaction
+from django.db.models import Q
 from django.views.generic import UpdateView, ListView
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.utils import timezone
 from django_eventstream import send_event
-from rest_framework import generics, serializers
+from rest_framework import exceptions, generics, serializers, status
+from rest_framework.response import Response
 
-from observations.models import Observation
+from analysis.tasks import update_waterfall
+from observations.models import Observation, Sample
 from observations.serializers import ConfigurationSerializer, SampleSerializer
-from .models import Telescope
+from .models import SpectrumFile, Telescope, UploadSession
 from .permissions import IsTelescopeUpdatingItself
 
 from . import tasks as _  # noqa
@@ -210,7 +224,9 @@ class SampleDataTransmitView(generics.CreateAPIView):
     )
 
     def perform_create(self, serializer):
-        return serializer.save(telescope=self.telescope)
+        sample = serializer.save(telescope=self.telescope)
+        transaction.on_commit(lambda: update_waterfall.delay(sample.uuid))
+        return sample
 
     def create(self, request, pk=None):
         self.telescope = get_object_or_404(Telescope, id=pk)
@@ -224,3 +240,490 @@ class SampleDataTransmitView(generics.CreateAPIView):
                 'dt': timezone.now().isoformat(),
             })
         return response
+
+
+class BatchTooLarge(exceptions.APIException):
+
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'The batch is too large.'
+    default_code = 'batch_too_large'
+
+
+class SampleBatchTransmitView(generics.GenericAPIView):
+    """ Accept many samples in a single request, either as several `data`
+    files in a multipart form or as a tar stream of sample files. The whole
+    batch is created in one transaction and the response lists the outcome of
+    each item so that the client only needs to retry the failures.
+    """
+
+    queryset = Telescope.objects.filter(status=Telescope.Status.ACTIVE)
+    serializer_class = SampleSerializer
+    permission_classes = (
+        IsTelescopeUpdatingItself,
+    )
+
+    tar_content_types = (
+        'application/x-tar',
+        'application/tar',
+    )
+
+    def get_files(self, request):
+        if request.content_type not in self.tar_content_types:
+            yield from request.FILES.getlist('data')
+            return
+
+        # The request body can only be read once, so each member is copied to
+        # a temporary file as the stream is read.
+        total_size = 0
+        with tarfile.open(fileobj=request.stream, mode='r|') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                total_size += member.size
+                if total_size > settings.UPLOAD_BATCH_MAX_SIZE:
+                    raise BatchTooLarge(
+                        f'Batches may not be larger than {settings.UPLOAD_BATCH_MAX_SIZE} bytes.'
+                    )
+                file = TemporaryUploadedFile(
+                    os.path.basename(member.name),
+                    'application/octet-stream',
+                    member.size,
+                    None,
+                )
+                shutil.copyfileobj(archive.extractfile(member), file)
+                file.seek(0)
+                yield file
+
+    def post(self, request, pk=None):
+        telescope = get_object_or_404(Telescope, id=pk)
+
+        results = []
+        samples = []
+        files = []
+        related = {}
+        try:
+            for file in self.get_files(request):
+                files.append(file)
+                serializer = self.get_serializer(data={'data': file})
+                try:
+                    serializer.is_valid(raise_exception=True)
+                    data = serializer.get_sample_data(
+                        {**serializer.validated_data, 'telescope': telescope},
+                        related,
+                    )
+                except serializers.ValidationError as e:
+                    results.append({'name': file.name, 'status': 'error', 'error': e.detail})
+                except (KeyError, ValueError, ObjectDoesNotExist) as e:
+                    results.append({'name': file.name, 'status': 'error', 'error': str(e)})
+                else:
+                    sample = Sample(**data)
+                    samples.append(sample)
+                    results.append({'name': file.name, 'status': 'created', 'uuid': sample.uuid})
+
+            if not results:
+                return Response(
+                    {'detail': 'No samples were provided.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            def _update_waterfalls():
+                for sample in samples:
+                    update_waterfall.delay(sample.uuid)
+
+            try:
+                with transaction.atomic():
+                    Sample.objects.bulk_create(samples)
+                    transaction.on_commit(_update_waterfalls)
+            except Exception:
+                # Files are written to storage as each row is prepared, so
+                # they outlive a rolled back insert unless removed here.
+                for sample in samples:
+                    if sample.data._committed:
+                        sample.data.delete(save=False)
+                raise
+        finally:
+            # Storage may have moved temporary files into place already.
+            for file in files:
+                file.close()
+
+        if samples:
+            for channel in telescope.user_channels:
+                send_event(channel, 'message', {
+                    'type': 'sample-received',
+                    'id': telescope.public_id,
+                    'count': len(samples),
+                    'dt': timezone.now().isoformat(),
+                })
+
+        return Response(
+            {'created': len(samples), 'results': results},
+            status=(
+                status.HTTP_201_CREATED
+                if len(samples) == len(results)
+                else status.HTTP_207_MULTI_STATUS
+            ),
+        )
+
+
+class SpectrumFileSerializer(serializers.ModelSerializer):
+
+    id = serializers.UUIDField(source='uuid', read_only=True)
+
+    class Meta:
+        model = SpectrumFile
+        fields = (
+            'id',
+            'identifier',
+            'name',
+            'data',
+        )
+        read_only_fields = (
+            'identifier',
+            'name',
+        )
+        extra_kwargs = {
+            'data': {'write_only': True},
+        }
+
+    def validate_data(self, data):
+        ext = os.path.splitext(data.name)[1]
+        if ext not in SpectrumFile.EXTENSIONS:
+            raise serializers.ValidationError(f'Unsupported file type: {ext}')
+        return data
+
+
+def save_spectrum_file(telescope, data):
+    """ Store the file for the telescope, replacing any earlier upload of the
+    same file so that retries never leave duplicates. Returns the record and
+    whether it was newly created.
+    """
+    name = os.path.basename(data.name)
+
+    # The lookup is locked, and a concurrent create of the same file falls
+    # back to fetching the row that won.
+    spectrum_file, created = SpectrumFile.objects.select_for_update().get_or_create(
+        telescope=telescope,
+        name=name,
+        defaults={'identifier': os.path.splitext(name)[0]},
+    )
+    if not created:
+        previous = spectrum_file.data.name
+        transaction.on_commit(lambda: spectrum_file.data.storage.delete(previous))
+
+    spectrum_file.data.save(name, data, save=False)
+    spectrum_file.save()
+    return spectrum_file, created
+
+
+class SpectrumFileTransmitView(generics.CreateAPIView):
+    """ Receive a file of a spectrum that the telescope integrated itself
+    (see `SpectrumFile`), as a `data` file in a multipart form.
+    """
+
+    queryset = Telescope.objects.filter(status=Telescope.Status.ACTIVE)
+    serializer_class = SpectrumFileSerializer
+    permission_classes = (
+        IsTelescopeUpdatingItself,
+    )
+
+    def create(self, request, pk=None):
+        telescope = get_object_or_404(Telescope, id=pk)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            spectrum_file, created = save_spectrum_file(
+                telescope,
+                serializer.validated_data['data'],
+            )
+
+        for channel in telescope.user_channels:
+            send_event(channel, 'message', {
+                'type': 'spectrum-received',
+                'id': telescope.public_id,
+                'dt': timezone.now().isoformat(),
+            })
+        return Response(
+            self.get_serializer(spectrum_file).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+
+    id = serializers.UUIDField(source='uuid', read_only=True)
+    sample = serializers.UUIDField(source='sample.uuid', read_only=True, default=None)
+    spectrum_file = serializers.UUIDField(
+        source='spectrum_file.uuid',
+        read_only=True,
+        default=None,
+    )
+
+    class Meta:
+        model = UploadSession
+        fields = (
+            'id',
+            'kind',
+            'name',
+            'size',
+            'checksum',
+            'chunk_size',
+            'offset',
+            'sample',
+            'spectrum_file',
+        )
+        read_only_fields = (
+            'kind',
+            'chunk_size',
+            'offset',
+        )
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    """ Start (or resume) a chunked upload of a sample. An existing session
+    for the same file is returned as is, so the client either continues from
+    its offset or (if the file was already assembled) just completes it again.
+    """
+
+    queryset = Telescope.objects.filter(status=Telescope.Status.ACTIVE)
+    serializer_class = UploadSessionSerializer
+    permission_classes = (
+        IsTelescopeUpdatingItself,
+    )
+
+    kind = UploadSession.Kind.SAMPLE
+
+    def create(self, request, pk=None):
+        telescope = get_object_or_404(Telescope, id=pk)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        sessions = UploadSession.objects.filter(
+            telescope=telescope,
+            kind=self.kind,
+            name=serializer.validated_data['name'],
+            checksum=serializer.validated_data['checksum'],
+            size=serializer.validated_data['size'],
+        )
+        session = (
+            sessions
+            .exclude(completed_at=None)
+            .filter(Q(sample__isnull=False) | Q(spectrum_file__isnull=False))
+            .first()
+        ) or sessions.filter(completed_at=None).first()
+        if session:
+            if not session.completed_at and not session.has_partial_file:
+                session.restart()
+            return Response(self.get_serializer(session).data)
+
+        session = serializer.save(
+            telescope=telescope,
+            kind=self.kind,
+            chunk_size=settings.UPLOAD_CHUNK_SIZE,
+        )
+        session.create_partial_file()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class SpectrumFileUploadSessionCreateView(UploadSessionCreateView):
+    """ Start (or resume) a chunked upload of a spectrum file. """
+
+    kind = UploadSession.Kind.SPECTRUM_FILE
+
+
+class UploadSessionView(generics.RetrieveAPIView):
+    """ Report the progress of a chunked upload, or receive its next chunk.
+
+    Each chunk is PUT as the raw request body along with its position in a
+    `Content-Range: bytes <start>-<end>/<size>` header and its SHA-256 digest
+    in an `X-Chunk-SHA256` header. Chunks must arrive in order: a chunk that
+    doesn't start at the session's offset is rejected with the offset to
+    resume from.
+    """
+
+    serializer_class = UploadSessionSerializer
+    permission_classes = (
+        IsTelescopeUpdatingItself,
+    )
+
+    content_range = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+    kind = UploadSession.Kind.SAMPLE
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(telescope_id=self.kwargs['pk'], kind=self.kind)
+
+    def get_object(self):
+        return get_object_or_404(self.get_queryset(), uuid=self.kwargs['upload_id'])
+
+    def put(self, request, pk=None, upload_id=None):
+        with transaction.atomic():
+            session = get_object_or_404(
+                self.get_queryset().select_for_update(),
+                uuid=upload_id,
+                completed_at=None,
+            )
+
+            match = self.content_range.match(request.headers.get('Content-Range', ''))
+            if not match:
+                return Response(
+                    {'detail': 'A valid Content-Range header is required.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            start, end, size = (int(value) for value in match.groups())
+            length = end - start + 1
+            if size != session.size or length > session.chunk_size or end >= size:
+                return Response(
+                    {'detail': 'Invalid chunk range.', 'offset': session.offset},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if not session.has_partial_file:
+                session.restart()
+                return Response(
+                    {'detail': 'Upload was lost, start over.', 'offset': session.offset},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            if start != session.offset:
+                return Response(
+                    {'detail': 'Unexpected chunk.', 'offset': session.offset},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+            # Stream the chunk to the end of the partial file, then roll it
+            # back if it turns out to be corrupt.
+            digest = hashlib.sha256()
+            received = 0
+            stream = request.stream
+            with open(session.path, 'r+b') as f:
+                f.seek(session.offset)
+                while stream and received < length:
+                    data = stream.read(min(2**16, length - received))
+                    if not data:
+                        break
+                    digest.update(data)
+                    f.write(data)
+                    received += len(data)
+
+                if (
+                    received != length
+                    or digest.hexdigest() != request.headers.get('X-Chunk-SHA256')
+                ):
+                    f.truncate(session.offset)
+                    return Response(
+                        {'detail': 'Chunk checksum mismatch.', 'offset': session.offset},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+
+            session.offset += received
+            session.save(update_fields=('offset', 'updated_at'))
+
+        return Response(self.get_serializer(session).data)
+
+
+class SpectrumFileUploadSessionView(UploadSessionView):
+    """ Report the progress of a chunked upload of a spectrum file, or receive
+    its next chunk.
+    """
+
+    kind = UploadSession.Kind.SPECTRUM_FILE
+
+
+class UploadSessionCompleteView(generics.GenericAPIView):
+    """ Assemble a fully received upload into a sample. """
+
+    serializer_class = SampleSerializer
+    permission_classes = (
+        IsTelescopeUpdatingItself,
+    )
+
+    kind = UploadSession.Kind.SAMPLE
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(telescope_id=self.kwargs['pk'], kind=self.kind)
+
+    def assemble(self, session, telescope, f):
+        serializer = self.get_serializer(data={'data': File(f, name=session.name)})
+        serializer.is_valid(raise_exception=True)
+        session.sample = sample = serializer.save(telescope=telescope)
+
+        def _on_commit():
+            update_waterfall.delay(sample.uuid)
+            for channel in telescope.user_channels:
+                send_event(channel, 'message', {
+                    'type': 'sample-received',
+                    'id': telescope.public_id,
+                    'dt': timezone.now().isoformat(),
+                })
+
+        transaction.on_commit(_on_commit)
+
+    def post(self, request, pk=None, upload_id=None):
+        telescope = get_object_or_404(Telescope, id=pk)
+        with transaction.atomic():
+            session = get_object_or_404(
+                self.get_queryset().select_for_update(),
+                uuid=upload_id,
+            )
+            if session.completed_at:
+                # Already assembled (e.g. the client retried the request).
+                return Response(UploadSessionSerializer(session).data)
+
+            if not session.has_partial_file:
+                session.restart()
+                return Response(
+                    {'detail': 'Upload was lost, start over.', 'offset': session.offset},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            if not session.is_received:
+                return Response(
+                    {'detail': 'Upload is incomplete.', 'offset': session.offset},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+            with open(session.path, 'rb') as f:
+                checksum = hashlib.file_digest(f, 'sha256').hexdigest()
+
+            if checksum != session.checksum:
+                # Something went wrong along the way, so start over.
+                session.restart()
+                return Response(
+                    {'detail': 'File checksum mismatch.', 'offset': session.offset},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            with open(session.path, 'rb') as f:
+                self.assemble(session, telescope, f)
+
+            session.completed_at = timezone.now()
+            session.save(update_fields=(
+                'sample',
+                'spectrum_file',
+                'completed_at',
+                'updated_at',
+            ))
+
+            path = session.path
+            transaction.on_commit(lambda: os.remove(path))
+
+        return Response(
+            UploadSessionSerializer(session).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class SpectrumFileUploadSessionCompleteView(UploadSessionCompleteView):
+    """ Assemble a fully received upload into a spectrum file. """
+
+    serializer_class = SpectrumFileSerializer
+
+    kind = UploadSession.Kind.SPECTRUM_FILE
+
+    def assemble(self, session, telescope, f):
+        serializer = self.get_serializer(data={'data': File(f, name=session.name)})
+        serializer.is_valid(raise_exception=True)
+        spectrum_file, created = save_spectrum_file(
+            telescope,
+            serializer.validated_data['data'],
+        )
+        session.spectrum_file = spectrum_file
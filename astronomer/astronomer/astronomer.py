@@ -1,6 +1,6 @@
 import argparse
 import logging
-from multiprocessing import Manager, Pool
+from multiprocessing import Event, Process, Queue, SimpleQueue
 import sys
 import time
 
@@ -38,51 +38,54 @@ def main():
 
     # Kick off children
 
-    with Manager() as manager, Pool(7) as pool:
-        logger.debug('Configuring shared state...')
-        log_queue = manager.Queue()
-        event_queue = manager.Queue()
-        should_calibrate = manager.Event()
-        should_observe = manager.Event()
+    logger.debug('Configuring shared state...')
+    # The queues and events are inherited by each worker, so a put is a write
+    # to a pipe rather than a round trip through a Manager server process.
+    # The log worker only ever blocks on get, so its queue skips the feeder
+    # thread; the others need get with a timeout and batched draining.
+    log_queue = SimpleQueue()
+    event_queue = Queue()
+    should_calibrate = Event()
+    should_observe = Event()
+    # Completed readings are handed from one stage to the next.
+    capture_queue = Queue()
+    spectrum_queue = Queue()
 
-        results = []
+    from .workers.logger import log_events
+    from .workers.io import handle_io
+    from .workers.watch_sky import watch_sky
+    from .workers.spectrum import analyze_spectra
+    from .workers.downlink import downlink
+    from .workers.transmit import transmit
 
-        logger.info('Starting child processes...')
-        from .workers.logger import log_events
-        results.append(pool.apply_async(
-            log_events,
-            args=(log_queue, args.log_level)
-        ))
-        from .workers.io import handle_io
-        results.append(pool.apply_async(
-            handle_io,
-            args=(log_queue, event_queue, should_calibrate, should_observe)
-        ))
-        from .workers.watch_sky import watch_sky
-        results.append(pool.apply_async(
-            watch_sky,
-            args=(log_queue, event_queue, should_calibrate, should_observe)
-        ))
-        from .workers.spectrum import analyze_spectra
-        results.append(pool.apply_async(
-            analyze_spectra,
-            args=(log_queue, event_queue)
-        ))
-        from .workers.downlink import downlink
-        results.append(pool.apply_async(
-            downlink,
-            args=(log_queue, event_queue)
-        ))
-        from .workers.transmit import transmit
-        results.append(pool.apply_async(
-            transmit,
-            args=(log_queue, event_queue)
-        ))
+    workers = (
+        (log_events, (log_queue, args.log_level)),
+        (handle_io, (log_queue, event_queue, should_calibrate, should_observe)),
+        (watch_sky, (
+            log_queue,
+            event_queue,
+            should_calibrate,
+            should_observe,
+            capture_queue,
+        )),
+        (analyze_spectra, (log_queue, event_queue, capture_queue, spectrum_queue)),
+        (downlink, (log_queue, event_queue)),
+        (transmit, (log_queue, event_queue, spectrum_queue)),
+    )
+
+    logger.info('Starting child processes...')
+    processes = [
+        Process(target=target, args=worker_args, name=target.__name__, daemon=True)
+        for target, worker_args in workers
+    ]
+    for process in processes:
+        process.start()
 
-        try:
-            while not any(result.ready() for result in results):
-                time.sleep(settings.Wait.background)
-        finally:
-            pool.terminate()
+    try:
+        while all(process.is_alive() for process in processes):
+            time.sleep(settings.Wait.background)
+    finally:
+        for process in processes:
+            process.terminate()
 
-        logger.error('Process error with unknown child.')
+    logger.error('Process error with unknown child.')
@@ -1,19 +1,106 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass
+from enum import Enum
+
+import numpy as np
 
 
 @dataclass
 class FixedBuffer:
+    """ A preallocated ring buffer of the most recent `length` spectra.
+
+    A running total is updated as each spectrum is added so integrating the
+    buffer costs O(NFFT) regardless of its length. In `decay` mode older
+    spectra are exponentially down-weighted instead of dropped, and in
+    `median` mode the integrated value is the per-bin median of the buffer
+    (of the magnitudes, for complex spectra).
+    """
+
+    class Mode(str, Enum):
+        SUM = 'sum'
+        DECAY = 'decay'
+        MEDIAN = 'median'
+
     length: int
-    _data: [[float]] = field(default_factory=list)
+    mode: str = Mode.SUM
+    decay: float = 0.95
+    _data: np.ndarray = None
+    _total: np.ndarray = None
+    _index: int = 0
+    _count: int = 0
+    _weight: float = 0
+
+    def __post_init__(self):
+        # Fail loudly on an unknown mode rather than quietly summing.
+        self.mode = self.Mode(self.mode)
+
+    def _allocate(self, samples: np.ndarray):
+        self._data = np.zeros((self.length, samples.size), dtype=samples.dtype)
+        self._total = np.zeros(samples.size, dtype=samples.dtype)
+        self._index = 0
+        self._count = 0
+        self._weight = 0
 
     def add(self, samples: [float]):
-        self._data.insert(0, samples)
-        self._data = self._data[:self.length]
+        samples = np.asarray(samples)
+
+        if self._data is None or self._data.shape[1] != samples.size:
+            self._allocate(samples)
+        elif not np.can_cast(samples.dtype, self._data.dtype):
+            # e.g. Switching from float32 to float64 spectra.
+            dtype = np.result_type(samples.dtype, self._data.dtype)
+            self._data = self._data.astype(dtype)
+            self._total = self._total.astype(dtype)
+
+        if self.mode == self.Mode.DECAY:
+            self._total *= self.decay
+            self._total += samples
+            self._weight = self._weight * self.decay + 1
+        elif self._count == self.length:
+            self._total -= self._data[self._index]
+            self._total += samples
+        else:
+            self._total += samples
+
+        self._data[self._index] = samples
+        self._index = (self._index + 1) % self.length
+        self._count = min(self._count + 1, self.length)
+
+        if self.mode != self.Mode.DECAY and self._index == 0:
+            # Rebuild the total once per lap to keep floating point error
+            # from accumulating. This amortizes to O(NFFT) per insert.
+            self._total = self._data.sum(axis=0)
 
     def get_data(self) -> [[float]]:
-        return self._data
+        """ The buffered spectra, newest first. """
+        if self._data is None:
+            return np.empty((0, 0))
+        order = (self._index - 1 - np.arange(self._count)) % self.length
+        return self._data[order]
 
     @property
-    def percent_full(self):
-        return len(self._data) / self.length
+    def sum(self):
+        return self._total
+
+    @property
+    def mean(self):
+        if self.mode == self.Mode.DECAY:
+            return self._total / self._weight
+        return self._total / self._count
+
+    @property
+    def median(self):
+        data = self._data[:self._count]
+        if np.iscomplexobj(data):
+            data = np.abs(data)
+        return np.median(data, axis=0)
 
+    @property
+    def integrated(self):
+        """ The integrated spectrum for the buffer's mode. """
+        if self.mode == self.Mode.MEDIAN:
+            return self.median
+        return self._total.copy()
+
+    @property
+    def percent_full(self):
+        return self._count / self.length
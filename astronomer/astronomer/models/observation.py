@@ -12,6 +12,7 @@ class AbstractObservation:
     gain: int
     bandwidth: int
     timestamp: str = None
+    ppm: int = 0
 
     @property
     def meta(self) -> dict:
@@ -22,8 +23,14 @@ class AbstractObservation:
             gain=self.gain,
             bandwidth=self.bandwidth,
             timestamp=self.timestamp,
+            ppm=self.ppm,
         )
 
+    @property
+    def tuning(self) -> tuple:
+        """ The settings the device was tuned to, matching `Task.tuning`. """
+        return (self.frequency, self.sample_rate, self.gain, self.ppm or 0)
+
 
 @dataclass
 class Calibration(AbstractObservation):
@@ -33,6 +40,8 @@ class Calibration(AbstractObservation):
 @dataclass
 class Observation(AbstractObservation):
     calibration: Observation = None
+    # The server's identifier for the configuration that was captured.
+    configuration: str = None
 
     @property
     def summary(self) -> str:
@@ -44,7 +53,9 @@ class Observation(AbstractObservation):
 
     @property
     def meta(self) -> dict:
+        meta = super().meta
+        if self.configuration:
+            meta['configuration'] = self.configuration
         if self.calibration:
-            return dict(**super().meta, calibration=self.calibration.meta)
-        else:
-            return super().meta
+            meta['calibration'] = self.calibration.meta
+        return meta
@@ -0,0 +1,27 @@
+from dataclasses import dataclass, fields
+
+
+@dataclass
+class Task:
+    """ A capture requested by the home server. The id is the server's
+    configuration identifier (see `Configuration.get_identifier`) and is
+    passed on with every reading taken for the task.
+    """
+    id: str
+    frequency: float
+    sample_rate: float
+    sample_size: int
+    gain: float = 0
+    ppm: int = 0
+    # In seconds since the epoch.
+    start_at: int = None
+    end_at: int = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{field.name: row[field.name] for field in fields(cls)})
+
+    @property
+    def tuning(self):
+        """ The settings that the device has to be re-tuned to change. """
+        return (self.frequency, self.sample_rate, self.gain, self.ppm or 0)
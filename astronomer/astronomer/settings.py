@@ -11,6 +11,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # General Settings
 
 USER_AGENT = 'astronomer/1.0'
+# This telescope's id on the home server and the token it authenticates with.
+TELESCOPE_ID = os.environ.get('TELESCOPE_ID', '')
+API_TOKEN = os.environ.get('API_TOKEN', '')
 DEFAULT_REQUEST_TIMEOUT = 15
 DATABASE_LOCATION = os.path.expanduser(os.environ.get(
     'DATABASE_LOCATION',
@@ -22,6 +25,13 @@ CALIBRATION_DATA_PATH = os.path.expanduser(os.environ.get(
     os.path.join(BASE_DIR, './data/calibration'),
 ))
 
+# Reference spectra that are no longer current are kept this long (in seconds)
+# for the readings that were taken with them and are yet to be processed.
+CALIBRATION_RETENTION = int(os.environ.get(
+    'CALIBRATION_RETENTION',
+    7 * 24 * 60 * 60,
+))
+
 CALIBRATE_STATUS_PIN = 24
 
 # Capture Settings
@@ -54,6 +64,30 @@ CAPTURE_SAMPLE_SIZE = 2**25 + 32
 
 WARM_UP_SAMPLES = CAPTURE_SAMPLE_SIZE
 
+# When enabled, captures are integrated into a spectrum as they are read from
+# the SDR and the raw signal is only written to disk if it is kept.
+CAPTURE_FUSED_MODE_ENABLED = bool(int(os.environ.get(
+    'CAPTURE_FUSED_MODE_ENABLED',
+    0,
+)))
+
+CAPTURE_KEEP_RAW = bool(int(os.environ.get(
+    'CAPTURE_KEEP_RAW',
+    0,
+)))
+
+CAPTURE_RAW_DATA_PATH = os.path.expanduser(os.environ.get(
+    'CAPTURE_RAW_DATA_PATH',
+    os.path.join(BASE_DIR, './data/raw'),
+))
+
+# When enabled, the SDR is kept open and read through pyrtlsdr's async API
+# instead of starting an rtl_sdr process for every reading.
+CAPTURE_STREAMING_ENABLED = bool(int(os.environ.get(
+    'CAPTURE_STREAMING_ENABLED',
+    0,
+)))
+
 # Spectrum Settings
 
 SPECTRUM_DATA_PATH = os.path.expanduser(os.environ.get(
@@ -66,8 +100,25 @@ SPECTRUM_STATUS_PIN = int(os.environ.get(
     26,  # TODO
 ))
 
-SIGNAL_BUFFER_LENGTH = 50
+SIGNAL_BUFFER_LENGTH = int(os.environ.get(
+    'SIGNAL_BUFFER_LENGTH',
+    50,
+))
+# How spectra in the buffer are integrated: sum, decay, or median.
+SIGNAL_BUFFER_MODE = os.environ.get(
+    'SIGNAL_BUFFER_MODE',
+    'sum',
+)
+SIGNAL_BUFFER_DECAY = float(os.environ.get(
+    'SIGNAL_BUFFER_DECAY',
+    0.95,
+))
 SPECTRUM_BATCH_SIZE = 10
+# Subtract the mean of each capture to suppress the tuner's DC spike.
+SPECTRUM_REMOVE_DC = bool(int(os.environ.get(
+    'SPECTRUM_REMOVE_DC',
+    0,
+)))
 
 # Transmit Settings
 
@@ -103,25 +154,76 @@ TRANSMIT_REMOTE_DIRECTORY = os.environ.get(
     'data/'
 )
 
+# Either `scp` to copy files to the remote directory above, or `http` to
+# upload them to the home server's transmit API.
+TRANSMIT_BACKEND = os.environ.get(
+    'TRANSMIT_BACKEND',
+    'scp',
+)
+# The home server's endpoint for the files of integrated spectra.
+TRANSMIT_URL = os.environ.get(
+    'TRANSMIT_URL',
+    urllib.parse.urljoin(HOME_URL, f'/api/telescope/{TELESCOPE_ID}/transmit/files'),
+)
+# Files larger than this (in bytes) are sent in resumable chunks.
+TRANSMIT_RESUMABLE_SIZE = int(os.environ.get(
+    'TRANSMIT_RESUMABLE_SIZE',
+    8 * 2**20,
+))
+# The upload budget, which is scaled back while the server is under pressure.
+TRANSMIT_REQUESTS_PER_SECOND = float(os.environ.get(
+    'TRANSMIT_REQUESTS_PER_SECOND',
+    5,
+))
+TRANSMIT_BYTES_PER_SECOND = float(os.environ.get(
+    'TRANSMIT_BYTES_PER_SECOND',
+    2 * 2**20,
+))
+# Responses slower than this (in seconds) are taken as a sign of load.
+TRANSMIT_TARGET_LATENCY = float(os.environ.get(
+    'TRANSMIT_TARGET_LATENCY',
+    5,
+))
+TRANSMIT_MAX_RETRIES = int(os.environ.get(
+    'TRANSMIT_MAX_RETRIES',
+    3,
+))
+# The number of uploads in flight at once.
+TRANSMIT_CONCURRENCY = int(os.environ.get(
+    'TRANSMIT_CONCURRENCY',
+    4,
+))
+
 
 # Downlink Settings
 
 DOWNLINK_CONFIGURATION_URL = os.environ.get(
     'DOWNLINK_CONFIGURATION_URL',
-    urllib.parse.urljoin(HOME_URL, '/'),
+    urllib.parse.urljoin(HOME_URL, f'/api/telescope/{TELESCOPE_ID}/tasks'),
 )
 DOWNLINK_EVENT_STREAM_URL = os.environ.get(
     'DOWNLINK_EVENT_STREAM_URL',
-    urllib.parse.urljoin(HOME_URL, '/'),
+    urllib.parse.urljoin(HOME_URL, f'/api/events/TEL-{TELESCOPE_ID}'),
 )
 DOWNLINK_EVENT_STREAM_TIMEOUT = 30
-DOWNLINK_RECONNECT_SECONDS = 10
+DOWNLINK_RECONNECT_SECONDS = int(os.environ.get(
+    'DOWNLINK_RECONNECT_SECONDS',
+    10,
+))
 
 DOWNLINK_STATUS_PIN = int(os.environ.get(
     'DOWNLINK_STATUS_PIN',
     11,
 ))
 
+# I/O Settings
+
+# The most status events taken off the queue (and collapsed) at once.
+IO_MAX_EVENT_BATCH = int(os.environ.get(
+    'IO_MAX_EVENT_BATCH',
+    256,
+))
+
 
 class Wait:
     device = 0.3
@@ -134,3 +236,38 @@ class Wait:
 TEST_SOCKET_HOST = ''
 TEST_SOCKET_SEND_PORT = 50008
 TEST_SOCKET_RECV_PORT = 50007
+
+# Test SDR
+# The test device generates a synthetic sky with the following sources. Set a
+# seed to make captures reproducible.
+
+TEST_SDR_SEED = os.environ.get('TEST_SDR_SEED')
+TEST_SDR_SEED = int(TEST_SDR_SEED) if TEST_SDR_SEED else None
+
+TEST_SDR_NOISE_TEMPERATURE = float(os.environ.get(
+    'TEST_SDR_NOISE_TEMPERATURE',
+    100,
+))
+
+TEST_SDR_HYDROGEN_TEMPERATURE = float(os.environ.get(
+    'TEST_SDR_HYDROGEN_TEMPERATURE',
+    50,
+))
+
+# In m/s, positive is receding.
+TEST_SDR_HYDROGEN_VELOCITY = float(os.environ.get(
+    'TEST_SDR_HYDROGEN_VELOCITY',
+    0,
+))
+
+# A comma separated list of frequencies (in Hz).
+TEST_SDR_RFI_FREQUENCIES = [
+    float(value)
+    for value in os.environ.get('TEST_SDR_RFI_FREQUENCIES', '').split(',')
+    if value.strip()
+]
+
+TEST_SDR_DC_SPIKE = float(os.environ.get(
+    'TEST_SDR_DC_SPIKE',
+    10,
+))
@@ -1,13 +1,20 @@
+from datetime import datetime, timezone
 import sqlite3
 
-from . import settings
+from .. import settings
 
 
+# The tables only cache what the home server sends (and are refilled from it
+# on startup), so when the schema changes the old tables are simply dropped.
+SCHEMA_VERSION = 2
+
+# Task times are stored as integer seconds since the epoch (UTC), and a task
+# is active from its `start_at` up to, but not including, its `end_at`.
 CREATE_TASK_TABLE_SCRIPT = """
     CREATE TABLE IF NOT EXISTS "task" (
-        id VARCHAR(12) DEFAULT NULL,
-        start_at TIMESTAMP DEFAULT NULL,
-        end_at TIMESTAMP DEFAULT NULL,
+        id VARCHAR(64) PRIMARY KEY NOT NULL,
+        start_at INTEGER NOT NULL,
+        end_at INTEGER NOT NULL,
         frequency NUMERIC DEFAULT NULL,
         sample_rate NUMERIC DEFAULT NULL,
         sample_size NUMERIC DEFAULT NULL,
@@ -15,10 +22,12 @@ CREATE_TASK_TABLE_SCRIPT = """
         gain NUMERIC DEFAULT NULL,
         created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
     );
+    CREATE INDEX IF NOT EXISTS "task_start_at_end_at"
+        ON "task" (start_at, end_at);
 """
 CREATE_TELESCOPE_TABLE_SCRIPT = """
     CREATE TABLE IF NOT EXISTS "telescope" (
-        id INTEGER DEFAULT NULL,
+        id INTEGER PRIMARY KEY,
         name VARCHAR(256) DEFAULT NULL,
         latitude NUMERIC DEFAULT NULL,
         longitude NUMERIC DEFAULT NULL,
@@ -44,15 +53,44 @@ SETUP_SCRIPTS = (
 )
 
 
+DROP_TABLES_SCRIPT = """
+    DROP TABLE IF EXISTS "task";
+    DROP TABLE IF EXISTS "telescope";
+"""
+
+
 def setup_and_connect():
     connection = sqlite3.connect(settings.DATABASE_LOCATION)
     connection.row_factory = sqlite3.Row
     with connection as cursor:
+        version, = cursor.execute('PRAGMA user_version').fetchone()
+        if version != SCHEMA_VERSION:
+            cursor.executescript(DROP_TABLES_SCRIPT)
         for script in SETUP_SCRIPTS:
             cursor.executescript(script)
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
     return connection
 
 
+def get_data_version(cursor):
+    """ A counter that changes whenever another connection commits. """
+    version, = cursor.execute('PRAGMA data_version').fetchone()
+    return version
+
+
+def to_timestamp(value):
+    """ Convert an ISO date (assumed UTC when naive) to epoch seconds. """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
 def truncate_tables(cursor):
     cursor.executescript("""
         BEGIN;
@@ -87,18 +125,37 @@ def insert_telescope(telescope, cursor):
 
 
 def list_active_tasks(cursor, now):
+    now = to_timestamp(now)
     return cursor.execute("""
         SELECT * FROM task
         WHERE
-            ? >= start_at
-            AND ? <= end_at
+            start_at <= ?
+            AND end_at > ?
         ;
-    """, (now.isoformat(), now.isoformat()))
+    """, (now, now))
+
+
+def get_next_start(cursor, now):
+    """ When the next task that hasn't started yet starts (or None). """
+    start_at, = cursor.execute("""
+        SELECT MIN(start_at) FROM task
+        WHERE start_at > ?
+    """, (to_timestamp(now),)).fetchone()
+    return start_at
+
+
+def is_scheduled(task):
+    """ Whether the task has both a start and an end. Observations can be
+    saved on the server before they are scheduled, and only scheduled tasks
+    are stored.
+    """
+    return task.get('start_at') is not None and task.get('end_at') is not None
 
 
 def insert_task(task, cursor):
+    # Replacing makes a replayed event harmless.
     return cursor.execute("""
-        INSERT INTO task (
+        INSERT OR REPLACE INTO task (
             id,
             start_at,
             end_at,
@@ -119,8 +176,8 @@ def insert_task(task, cursor):
         )
     """, (
         task['id'],
-        task['start_at'],
-        task['end_at'],
+        to_timestamp(task['start_at']),
+        to_timestamp(task['end_at']),
         task['frequency'],
         task['sample_rate'],
         task['sample_size'],
@@ -141,8 +198,8 @@ def update_task(task, cursor):
             gain = ?
         WHERE id = ?
     """, (
-        task['start_at'],
-        task['end_at'],
+        to_timestamp(task['start_at']),
+        to_timestamp(task['end_at']),
         task['frequency'],
         task['sample_rate'],
         task['sample_size'],
@@ -154,7 +211,7 @@ def update_task(task, cursor):
 
 def delete_task(task, cursor):
     return cursor.execute("""
-        DELETE task WHERE id = ?
+        DELETE FROM task WHERE id = ?
     """, (
         task['id'],
     ))
@@ -1,21 +1,108 @@
+from abc import ABC, abstractmethod
 from contextlib import contextmanager
-import math
-import random
-from subprocess import run, CalledProcessError
+import queue
+import shlex
+from subprocess import run, CalledProcessError, DEVNULL, PIPE, Popen
+import threading
 import time
 
 import numpy as np
 
 from .. import settings
+from ..utils import iqd, synthetic
 
 
-class TestSDR:
+class AsyncStreamMixin(ABC):
+    """ Stream a reading from a device with a callback-based API. A reader
+    thread copies each callback's data, in order, into a small pool of
+    preallocated buffers and the blocks are yielded from those buffers as they
+    fill up, so the stream is contiguous and never allocated per block.
+    """
+
+    buffer_count = 8
+
+    @abstractmethod
+    def _read_bytes_async(self, callback, num_bytes):
+        """ Read from the device, calling `callback(values, context)` with
+        each block of raw capture bytes until the read is cancelled.
+        """
+
+    @abstractmethod
+    def _cancel_read_async(self):
+        """ Stop the read started by `_read_bytes_async`. """
+
+    def stream_samples(self, n, block_size):
+        """ Yield `n` samples of raw capture bytes, `block_size` samples at a
+        time. Each block is a view into a reused buffer and is only valid
+        until the next block is requested.
+        """
+        chunk_bytes = block_size * iqd.SAMPLE_BYTES
+        buffers = np.empty((self.buffer_count, chunk_bytes), dtype=np.uint8)
+        # One buffer is held by the consumer and one is being filled.
+        ready = queue.Queue(maxsize=self.buffer_count - 2)
+        state = {'index': 0, 'offset': 0, 'remaining': n * iqd.SAMPLE_BYTES}
+
+        def _callback(values, context):
+            data = _as_bytes(values)
+            while data.size and state['remaining'] > 0:
+                index, offset = state['index'], state['offset']
+                size = min(data.size, chunk_bytes - offset, state['remaining'])
+                buffers[index, offset:offset + size] = data[:size]
+                data = data[size:]
+                state['offset'] += size
+                state['remaining'] -= size
+
+                if state['offset'] == chunk_bytes or state['remaining'] <= 0:
+                    ready.put((index, state['offset']))
+                    state['index'] = (index + 1) % self.buffer_count
+                    state['offset'] = 0
+
+            if state['remaining'] <= 0:
+                self._cancel_read_async()
+
+        def _read():
+            try:
+                self._read_bytes_async(_callback, chunk_bytes)
+            except Exception as e:
+                ready.put(e)
+            finally:
+                ready.put(None)
+
+        thread = threading.Thread(target=_read, daemon=True)
+        thread.start()
+        try:
+            while (item := ready.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                index, size = item
+                yield memoryview(buffers[index, :size])
+        finally:
+            self._cancel_read_async()
+            # Unblock the reader if it's waiting on a full queue.
+            while thread.is_alive():
+                try:
+                    ready.get(timeout=settings.Wait.device)
+                except queue.Empty:
+                    pass
+
+
+def _as_bytes(values):
+    try:
+        return np.frombuffer(values, dtype=np.uint8)
+    except TypeError:
+        return np.asarray(values, dtype=np.uint8)
+
+
+class TestSDR(AsyncStreamMixin):
 
     sample_rate = 1e6
     center_freq = 1e6
     bandwidth = 1e6
     gain = 10
 
+    def __init__(self):
+        self.readings = 0
+
     def set_bias_tee(self, value, device_index=0):
         pass
 
@@ -23,20 +110,53 @@ class TestSDR:
         time.sleep(delay)
         return True
 
+    def get_generator(self):
+        """ Build the synthetic sky for the current settings. With a seed,
+        each reading is reproducible but still differs from the last.
+        """
+        seed = settings.TEST_SDR_SEED
+        if seed is not None:
+            seed += self.readings
+        self.readings += 1
+
+        sources = [
+            synthetic.HydrogenLine(
+                temperature=settings.TEST_SDR_HYDROGEN_TEMPERATURE,
+                velocity=settings.TEST_SDR_HYDROGEN_VELOCITY,
+            ),
+            synthetic.DCSpike(amplitude=settings.TEST_SDR_DC_SPIKE),
+            *(
+                synthetic.Tone(frequency=frequency)
+                for frequency in settings.TEST_SDR_RFI_FREQUENCIES
+            ),
+        ]
+        return synthetic.SignalGenerator(
+            sample_rate=self.sample_rate,
+            center_freq=self.center_freq,
+            noise_temperature=settings.TEST_SDR_NOISE_TEMPERATURE,
+            sources=sources,
+            seed=seed,
+        )
+
     def read_samples(self, destination_path, n):
         time.sleep(n // self.sample_rate // 2)  # The test device is faster than normal.
+        self.get_generator().write(destination_path, n)
+
+    def _read_bytes_async(self, callback, num_bytes):
+        """ Simulate the device's callback API by generating blocks of data
+        on the reader thread until the read is cancelled.
+        """
+        self._cancelled = False
+        generator = self.get_generator()
 
-        t = random.random()
-        Ax, Ay  = random.random(), random.random()
-        data = np.array([
-            complex(
-                Ax * math.sin(x*self.center_freq + t)
-                + Ay * math.cos(x*self.center_freq + t))
-            for x in range(n)
-        ]) + np.random.normal(0, 1, n)
+        count = num_bytes // iqd.SAMPLE_BYTES
+        start = 0
+        while not self._cancelled:
+            callback(next(generator.iter_raw(count, count, start=start)), None)
+            start += count
 
-        with open(destination_path, 'wb') as f:
-            f.write(data.tobytes())
+    def _cancel_read_async(self):
+        self._cancelled = True
 
 
 class RTLSDR:
@@ -73,8 +193,8 @@ class RTLSDR:
             return True
 
     def read_samples(self, destination_path, n, device_index=0):
-        """ Take a reading from the device given the settings provided
-        and save those to the a file as a compressed archive.
+        """ Take a reading from the device and save it to the given file as
+        is, which is the capture layout (see `iqd.SAMPLE_DTYPE`).
         """
         command = f"""
             rtl_sdr \
@@ -88,12 +208,112 @@ class RTLSDR:
                 {destination_path}
         """
         return run(
-            command,
-            shell=True,
+            shlex.split(command),
+            check=True,
             capture_output=True,
             cwd=settings.CAPTURE_DATA_PATH,
         )
 
+    def stream_samples(self, n, block_size, device_index=0):
+        """ Take a reading from the device and yield the raw bytes as they
+        arrive, `block_size` samples at a time, instead of writing them to
+        disk.
+        """
+        command = f"""
+            rtl_sdr \
+                -f {self.center_freq} \
+                -s {self.sample_rate} \
+                -d {device_index} \
+                -g {self.gain} \
+                -p {self.ppm} \
+                -S \
+                -n {n} \
+                -
+        """
+        process = Popen(
+            shlex.split(command),
+            stdout=PIPE,
+            stderr=DEVNULL,
+            cwd=settings.CAPTURE_DATA_PATH,
+        )
+        try:
+            while chunk := process.stdout.read(block_size * iqd.SAMPLE_BYTES):
+                yield chunk
+            if process.wait():
+                raise CalledProcessError(process.returncode, command)
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+
+
+class AsyncRTLSDR(AsyncStreamMixin, RTLSDR):
+    """ Keep the device open between readings and read from it through
+    pyrtlsdr's async callback API. The device is only re-tuned when a setting
+    actually changes, so consecutive readings skip the USB setup and PLL
+    settling that `rtl_sdr` pays on every call.
+    """
+
+    def __init__(self, device_index=0):
+        self.device_index = device_index
+        self._device = None
+        self._tuned = {}
+
+    def _get_device(self):
+        if self._device is None:
+            from rtlsdr import RtlSdr
+            self._device = RtlSdr(device_index=self.device_index)
+            self._tuned = {}
+
+        for name, value in (
+            ('sample_rate', self.sample_rate),
+            ('center_freq', self.center_freq),
+            ('gain', self.gain),
+            ('freq_correction', self.ppm),
+        ):
+            if self._tuned.get(name) == value:
+                continue
+            if name == 'freq_correction' and not (value or self._tuned):
+                # The device defaults to 0 and rejects setting it again.
+                self._tuned[name] = value
+                continue
+            setattr(self._device, name, value)
+            self._tuned[name] = value
+
+        return self._device
+
+    def _read_bytes_async(self, callback, num_bytes):
+        self._get_device().read_bytes_async(callback, num_bytes=num_bytes)
+
+    def _cancel_read_async(self):
+        if self._device is not None:
+            try:
+                self._device.cancel_read_async()
+            except Exception:
+                pass
+
+    def close(self):
+        if self._device is not None:
+            self._device.close()
+            self._device = None
+
+    def test_device(self, n=512, device_index=0):
+        try:
+            for _ in self.stream_samples(n, n):
+                pass
+        except Exception:
+            return False
+        else:
+            return True
+
+    def set_bias_tee(self, value, device_index=0):
+        try:
+            self._get_device().set_bias_tee(bool(value))
+        except Exception:
+            return False
+        else:
+            return True
+
 
 class DefaultDevice:
 
@@ -102,11 +322,15 @@ class DefaultDevice:
         *args,
         test_mode=False,
         bias_tee=False,
+        streaming=False,
         **kwargs,
     ):
         if test_mode:
             self.sdr = TestSDR()
             self.bias_tee = bias_tee
+        elif streaming:
+            self.sdr = AsyncRTLSDR()
+            self.bias_tee = bias_tee
         else:
             self.sdr = RTLSDR()
             self.bias_tee = bias_tee
@@ -117,6 +341,7 @@ class DefaultDevice:
         frequency=None,
         bandwidth=None,
         gain=None,
+        ppm=None,
     ):
         self.sdr.set_bias_tee(self.bias_tee)
         if sample_rate:
@@ -127,6 +352,8 @@ class DefaultDevice:
             self.sdr.bandwidth = bandwidth
         if gain:
             self.sdr.gain = gain
+        if ppm is not None:
+            self.sdr.ppm = ppm
 
     def test(self, n=1, **kwargs):
         try:
@@ -140,3 +367,7 @@ class DefaultDevice:
     def read(self, destination_path, n, **kwargs):
         self.set_settings(**kwargs)
         return self.sdr.read_samples(destination_path, n)
+
+    def stream(self, n, block_size=iqd.BLOCK_SIZE, **kwargs):
+        self.set_settings(**kwargs)
+        yield from self.sdr.stream_samples(n, block_size)
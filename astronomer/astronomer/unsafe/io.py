@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from dataclasses import dataclass
 import logging
 import socket
@@ -26,17 +27,26 @@ except ImportError:
 
 
 # BEGIN Test Rig
+# The rig and the test panel exchange UDP datagrams, each carrying one or more
+# newline separated messages. There is no connection to set up per update and
+# a batch of light changes travels as a single packet.
+
+MESSAGE_SEPARATOR = b'\n'
+MAX_DATAGRAM_SIZE = 4096
+
+dummy_socket = None
+dummy_batch = None
 
 
 def get_dummy_socket_server(callback):
     def _socket_server():
-        soc = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        soc = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         soc.bind((settings.TEST_SOCKET_HOST, settings.TEST_SOCKET_RECV_PORT))
         while True:
-            soc.listen(5)
-            client, address = soc.accept()
-            response = client.recv(255)
-            callback(response)
+            data, address = soc.recvfrom(MAX_DATAGRAM_SIZE)
+            for message in data.split(MESSAGE_SEPARATOR):
+                if message:
+                    callback(message)
     return _socket_server
 
 
@@ -47,16 +57,46 @@ def handle_dummy_callback(message: bytes):
         logger.warning(f'Invalid message {message}')
 
 
-def dummy_socket_send(message: [bytes]):
+def _dummy_socket_send(messages: [bytes]):
+    global dummy_socket
+    if dummy_socket is None:
+        dummy_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((settings.TEST_SOCKET_HOST, settings.TEST_SOCKET_SEND_PORT))
-            s.sendall(message)
-            logger.info(f'Message sent: {message}.')
+        dummy_socket.sendto(
+            MESSAGE_SEPARATOR.join(messages),
+            (settings.TEST_SOCKET_HOST, settings.TEST_SOCKET_SEND_PORT),
+        )
+        logger.info(f'Messages sent: {messages}.')
     except IOError as e:
         logger.error(f'Unable to send message to remote socket: {e}')
 
 
+def dummy_socket_send(message: bytes):
+    if dummy_batch is not None:
+        dummy_batch.append(message)
+    else:
+        _dummy_socket_send([message])
+
+
+@contextmanager
+def batch_updates():
+    """ Send every message sent within the block together when it ends. """
+    global dummy_batch
+    if dummy_batch is not None:
+        # Already batching.
+        yield
+        return
+
+    dummy_batch = []
+    try:
+        yield
+    finally:
+        messages, dummy_batch = dummy_batch, None
+        if messages:
+            _dummy_socket_send(messages)
+
+
 def setup_dummy_server():
     server = get_dummy_socket_server(handle_dummy_callback)
     thread = threading.Thread(target=server)
@@ -107,28 +147,47 @@ class Light:
             logger.warning(f'[GPIO Unavailable] Pin {self.pin} setup.')
         self.off()
 
-    def _flash(self, n=1, delay=FAST_DELAY, end_state=False):
-        for _ in range(0, n):
-            self.off()
-            time.sleep(delay)
-            self.on()
-            time.sleep(delay)
-            self.off()
-            time.sleep(delay)
+    def _flash_steps(self, n=1, delay=FAST_DELAY, end_state=False):
+        steps = [(False, delay), (True, delay), (False, delay)] * n
         if end_state:
-            self.on()
+            steps.append((True, 0))
+        return steps
+
+    def get_animation(self, method):
+        """ The (state, seconds to hold it) steps played for the method. """
+        if method == 'on':
+            return [(True, 0)]
+        elif method == 'off':
+            return [(False, 0)]
+        elif method == 'flash_ok':
+            return self._flash_steps(n=2, delay=self.FAST_DELAY)
+        elif method == 'flash_error':
+            return self._flash_steps(n=3, delay=self.SLOW_DELAY)
+        raise KeyError(method)
+
+    def play(self, steps):
+        """ Play the steps in place. This blocks until they are done. """
+        for state, delay in steps:
+            self.set(state)
+            time.sleep(delay)
 
     def flash_fast(self, n=1, end_state=False):
-        self._flash(n, self.FAST_DELAY, end_state)
+        self.play(self._flash_steps(n, self.FAST_DELAY, end_state))
 
     def flash_slow(self, n=1, end_state=False):
-        self._flash(n, self.SLOW_DELAY, end_state)
+        self.play(self._flash_steps(n, self.SLOW_DELAY, end_state))
 
     def flash_ok(self):
-        self.flash_fast(n=2)
+        self.play(self.get_animation('flash_ok'))
 
     def flash_error(self):
-        self.flash_slow(n=3)
+        self.play(self.get_animation('flash_error'))
+
+    def set(self, state):
+        if state:
+            self.on()
+        else:
+            self.off()
 
     def on(self):
         if GPIO:
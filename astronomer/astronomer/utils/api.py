@@ -1,9 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import importlib.util
+import os.path
 from subprocess import run
 import shlex
 
 import httpx
 
 from .. import settings
+from ..models.event import Event
+from .ratelimit import BACKOFF_STATUS_CODES, RateLimiter
 
 
 def health_check(timeout=settings.DEFAULT_REQUEST_TIMEOUT):
@@ -18,6 +24,77 @@ def health_check(timeout=settings.DEFAULT_REQUEST_TIMEOUT):
     return True
 
 
+def get_headers(token=settings.API_TOKEN, **headers):
+    headers['User-Agent'] = settings.USER_AGENT
+    if token:
+        headers['Authorization'] = f'Token {token}'
+    return headers
+
+
+def get_configuration(timeout=settings.DEFAULT_REQUEST_TIMEOUT):
+    response = httpx.get(
+        settings.DOWNLINK_CONFIGURATION_URL,
+        headers=get_headers(),
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def stream_events(
+    last_event_id=None,
+    url=settings.DOWNLINK_EVENT_STREAM_URL,
+    timeout=settings.DOWNLINK_EVENT_STREAM_TIMEOUT,
+    on_connect=None,
+):
+    """ Connect to the server-sent event stream and yield each event as it
+    arrives. When given the id of the last event seen, the server resumes the
+    stream from there. Returns when the server closes the stream and raises
+    if the connection drops (or is silent for longer than the timeout).
+
+    `on_connect` is called once the stream is open, before any events are
+    read, so nothing sent while it runs is missed.
+    """
+    headers = get_headers(Accept='text/event-stream')
+    if last_event_id:
+        headers['Last-Event-ID'] = last_event_id
+
+    with httpx.stream(
+        'GET',
+        url,
+        headers=headers,
+        timeout=httpx.Timeout(settings.DEFAULT_REQUEST_TIMEOUT, read=timeout),
+    ) as response:
+        response.raise_for_status()
+        if on_connect is not None:
+            on_connect()
+
+        event = Event()
+        data = []
+        for line in response.iter_lines():
+            if not line:
+                # A blank line dispatches the event.
+                if data:
+                    event.data = '\n'.join(data)
+                    yield event
+                event = Event(id=event.id)
+                data = []
+                continue
+
+            if line.startswith(':'):
+                # Comments are used as keep-alives.
+                continue
+
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'event':
+                event.event = value
+            elif field == 'data':
+                data.append(value)
+            elif field == 'id':
+                event.id = value
+
+
 def upload_observation(
     path,
     timeout=settings.DEFAULT_REQUEST_TIMEOUT,
@@ -31,3 +108,145 @@ def upload_observation(
         capture_output=True,
         timeout=timeout,
     )
+
+
+class Uploader:
+    """ Upload files to the home server's transmit API over a single
+    persistent client. Connections are kept alive (and multiplexed over
+    HTTP/2 when `h2` is installed) between uploads, up to `concurrency`
+    uploads are in flight at once, and file bodies are streamed from disk.
+    """
+
+    def __init__(
+        self,
+        url=settings.TRANSMIT_URL,
+        token=settings.API_TOKEN,
+        concurrency=settings.TRANSMIT_CONCURRENCY,
+        timeout=settings.DEFAULT_REQUEST_TIMEOUT,
+    ):
+        self.url = url
+        self.concurrency = concurrency
+        self.limiter = get_limiter()
+
+        headers = get_headers(token)
+
+        self.client = httpx.Client(
+            headers=headers,
+            timeout=timeout,
+            http2=importlib.util.find_spec('h2') is not None,
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+            ),
+        )
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def request(self, method, url, size=0, rewind=None, **kwargs):
+        """ Send the request within the rate limit, retrying (after however
+        long the server asks) while it says it is overloaded.
+        """
+        for attempt in range(settings.TRANSMIT_MAX_RETRIES + 1):
+            if rewind and attempt:
+                rewind()
+            self.limiter.acquire(size)
+            response = self.client.request(method, url, **kwargs)
+            self.limiter.record(
+                response.status_code,
+                response.elapsed.total_seconds(),
+                response.headers.get('Retry-After'),
+                size,
+            )
+            if response.status_code not in BACKOFF_STATUS_CODES:
+                break
+        return response
+
+    def upload(self, path):
+        size = os.path.getsize(path)
+        if size > settings.TRANSMIT_RESUMABLE_SIZE:
+            return self.upload_resumable(path)
+
+        with open(path, 'rb') as f:
+            response = self.request(
+                'POST',
+                self.url,
+                size,
+                rewind=lambda: f.seek(0),
+                files={'data': f},
+            )
+        response.raise_for_status()
+        return response
+
+    def upload_resumable(self, path):
+        """ Upload the file in checksummed chunks. The server keeps track of
+        what it has received, so if the upload is interrupted, uploading the
+        same file again picks up from the last chunk it acknowledged.
+        """
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            checksum = hashlib.file_digest(f, 'sha256').hexdigest()
+
+        response = self.request('POST', f'{self.url}/uploads', json={
+            'name': os.path.basename(path),
+            'size': size,
+            'checksum': checksum,
+        })
+        response.raise_for_status()
+        session = response.json()
+        session_url = f'{self.url}/uploads/{session["id"]}'
+
+        offset = session['offset']
+        with open(path, 'rb') as f:
+            while offset < size:
+                f.seek(offset)
+                chunk = f.read(session['chunk_size'])
+                response = self.request(
+                    'PUT',
+                    session_url,
+                    len(chunk),
+                    content=chunk,
+                    headers={
+                        'Content-Type': 'application/octet-stream',
+                        'Content-Range': f'bytes {offset}-{offset + len(chunk) - 1}/{size}',
+                        'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest(),
+                    },
+                )
+                if response.status_code != httpx.codes.CONFLICT:
+                    response.raise_for_status()
+                # On a conflict the server tells us where to resume from.
+                offset = response.json()['offset']
+
+        response = self.request('POST', f'{session_url}/complete')
+        response.raise_for_status()
+        return response
+
+    def upload_all(self, paths):
+        """ Upload the files concurrently. Yields each path with the error
+        that it failed with (or None) as the uploads finish.
+        """
+        futures = {self.executor.submit(self.upload, path): path for path in paths}
+        for future in as_completed(futures):
+            yield futures[future], future.exception()
+
+    def close(self):
+        self.executor.shutdown()
+        self.client.close()
+
+
+limiter: RateLimiter = None
+uploader: Uploader = None
+
+
+def get_limiter():
+    """ The process's shared rate limiter, used by every transmit backend. """
+    global limiter
+    if limiter is None:
+        limiter = RateLimiter()
+    return limiter
+
+
+def get_uploader():
+    """ The process's shared uploader, so connections outlive each batch. """
+    global uploader
+    if uploader is None:
+        uploader = Uploader()
+    return uploader
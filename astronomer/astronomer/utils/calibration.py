@@ -0,0 +1,109 @@
+""" A store of calibration reference spectra.
+
+Each calibration reading is integrated into a spectrum once, when it is taken,
+and saved as a small versioned vector. Observations refer to it by the
+calibration's identifier rather than carrying a copy of its raw signal.
+"""
+import json
+import os
+import os.path
+import tempfile
+import time
+
+import numpy as np
+
+from .. import settings
+from ..models.observation import Calibration
+
+
+# Bump whenever the way references are computed or stored changes so that
+# stale references are never applied.
+VERSION = 2
+
+EXTENSION = '.cal'
+
+
+def get_path(calibration_id, directory=settings.CALIBRATION_DATA_PATH):
+    return os.path.join(directory, f'{calibration_id}-v{VERSION}{EXTENSION}')
+
+
+def save(
+    calibration: Calibration,
+    values,
+    freqs,
+    directory=settings.CALIBRATION_DATA_PATH,
+):
+    """ Save the reference spectrum for the given calibration. """
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file first so readers never see a partial entry.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f,
+                version=VERSION,
+                values=values,
+                freqs=freqs,
+                meta=json.dumps(calibration.meta),
+            )
+        path = get_path(calibration.identifier, directory)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return path
+
+
+def load(calibration_id, directory=settings.CALIBRATION_DATA_PATH):
+    """ Load the reference spectrum for the given calibration or None if there
+    isn't one (or it was made by a different version).
+    """
+    try:
+        with np.load(get_path(calibration_id, directory)) as data:
+            if int(data['version']) != VERSION:
+                return None
+            return data['values']
+    except FileNotFoundError:
+        return None
+
+
+def prune(
+    keep=(),
+    max_age=settings.CALIBRATION_RETENTION,
+    directory=settings.CALIBRATION_DATA_PATH,
+):
+    """ Remove the references made by other versions, and those older than
+    `max_age` seconds unless their calibration's identifier is in `keep`.
+    """
+    suffix = f'-v{VERSION}{EXTENSION}'
+    cutoff = time.time() - max_age
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(EXTENSION):
+            continue
+        if entry.name.endswith(suffix):
+            if entry.name[:-len(suffix)] in keep:
+                continue
+            try:
+                if entry.stat().st_mtime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def apply(values, reference):
+    """ Express the spectrum relative to the calibration's reference. """
+    if reference.shape != values.shape:
+        raise ValueError('Spectrum size differed from calibration size')
+
+    return np.divide(
+        values,
+        reference,
+        out=np.zeros_like(values),
+        where=reference != 0,
+    )
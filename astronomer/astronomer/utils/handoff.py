@@ -0,0 +1,67 @@
+""" Hand completed files from one worker to the next.
+
+A producer writes its files, then atomically moves the config file into
+place and only then publishes the config's path on a queue. Consumers block
+on that queue rather than polling the directory, so they wake as soon as
+there is work and never see a partially written reading. Anything published
+before a consumer started (or lost when it stopped) is recovered by scanning
+the directory on startup.
+"""
+import json
+import os
+import os.path
+import queue
+import shutil
+
+from .. import settings
+
+
+CONFIG_FILE_EXTENSION = '.json'
+TEMPORARY_FILE_EXTENSION = '.tmp'
+
+
+def write_json(path, data):
+    """ Write the JSON data so that the file only ever appears complete. """
+    tmp_path = f'{path}{TEMPORARY_FILE_EXTENSION}'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def copy(source, destination):
+    """ Copy the file so that the destination only ever appears complete. """
+    tmp_path = f'{destination}{TEMPORARY_FILE_EXTENSION}'
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+def publish(work_queue, path):
+    if work_queue is not None:
+        work_queue.put(path)
+
+
+def scan(directory, ext=CONFIG_FILE_EXTENSION):
+    """ Find every completed config in the directory, oldest first. """
+    return [
+        os.path.join(directory, filename)
+        for filename in sorted(os.listdir(directory))
+        if filename.endswith(ext)
+    ]
+
+
+def wait(work_queue, timeout=settings.Wait.background, limit=None):
+    """ Block until work is published, then return it along with whatever
+    else is already waiting (up to `limit` paths). Returns an empty list if
+    nothing arrives before the timeout.
+    """
+    try:
+        paths = [work_queue.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+
+    while limit is None or len(paths) < limit:
+        try:
+            paths.append(work_queue.get_nowait())
+        except queue.Empty:
+            break
+    return paths
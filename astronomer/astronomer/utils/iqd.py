@@ -7,14 +7,145 @@ from typing import List, Optional
 import numpy as np
 
 from ..models.observation import Observation
+from . import handoff
+
+
+# The number of samples converted at a time when streaming a signal.
+BLOCK_SIZE = 2**16
+
+# Captures are stored as the RTL-SDR delivers them, as interleaved I/Q pairs
+# of offset-binary bytes, and are only converted when they are read.
+SAMPLE_DTYPE = np.uint8
+SAMPLE_OFFSET = 128
+SAMPLE_BYTES = 2 * np.dtype(SAMPLE_DTYPE).itemsize
 
 
 def write_config(path, observation: Observation):
-    with open(path, 'w') as f:
-        json.dump(observation.meta, f, indent=2)
+    handoff.write_json(path, observation.meta)
+
+
+def write_spectrum(path, values, freqs):
+    """ Save an already integrated spectrum (used in place of a raw signal). """
+    with open(path, 'wb') as f:
+        np.savez(f, values=values, freqs=freqs)
+
+
+def read_spectrum(path):
+    with np.load(path) as data:
+        return data['values'], data['freqs']
+
+
+def _to_complex(raw: np.ndarray):
+    values = raw.astype(np.float32)
+    values -= SAMPLE_OFFSET
+    return values.view(np.complex64).ravel()
+
 
+def to_complex(raw: bytes):
+    """ Convert raw capture bytes into complex64 samples. Any trailing partial
+    sample is dropped.
+    """
+    return _to_complex(
+        np.frombuffer(raw, dtype=SAMPLE_DTYPE, count=2 * (len(raw) // SAMPLE_BYTES)),
+    )
 
-def read(config_path, sig_ext='.iq', cal_ext='.ciq'):
+
+def get_path(config_path, ext):
+    directory = os.path.dirname(config_path)
+    name, _ = os.path.splitext(os.path.basename(config_path))
+    return os.path.join(directory, f'{name}{ext}')
+
+
+def get_paths(config_path, sig_ext='.iq', cal_ext='.ciq'):
+    """ Return the paths of the signal and calibration signal (if any) that
+    belong to the given config.
+    """
+    signal_path = get_path(config_path, sig_ext)
+    calibration_path = get_path(config_path, cal_ext)
+    if not os.path.exists(calibration_path):
+        calibration_path = None
+    return signal_path, calibration_path
+
+
+def get_length(signal_path):
+    """ The number of complex samples in the signal file. """
+    return os.path.getsize(signal_path) // SAMPLE_BYTES
+
+
+class Signal:
+    """ A lazy view over a raw capture on disk.
+
+    The capture is memory mapped rather than read, so nothing is loaded until
+    it is sliced, only the requested samples are converted to complex64, and
+    the pages are shared with the OS page cache instead of being copied into
+    each process. When `remove_dc` is set, the mean of the whole signal is
+    subtracted from every sample as it is converted.
+    """
+
+    def __init__(self, path, remove_dc=False):
+        self.path = path
+        self.remove_dc = remove_dc
+        self._raw = None
+        self._dc = None
+
+    def __len__(self):
+        return get_length(self.path)
+
+    @property
+    def raw(self):
+        """ The interleaved I/Q pairs as an (N, 2) memory mapped array. """
+        if self._raw is None:
+            length = len(self)
+            if length:
+                self._raw = np.memmap(
+                    self.path,
+                    dtype=SAMPLE_DTYPE,
+                    mode='r',
+                    shape=(length, 2),
+                )
+            else:
+                self._raw = np.empty((0, 2), dtype=SAMPLE_DTYPE)
+        return self._raw
+
+    @property
+    def dc(self):
+        """ The mean of the signal, computed a block at a time. """
+        if self._dc is None:
+            total = np.zeros(2, dtype=np.float64)
+            for start in range(0, len(self.raw), BLOCK_SIZE):
+                total += self.raw[start:start + BLOCK_SIZE].sum(axis=0, dtype=np.float64)
+            total /= max(1, len(self.raw))
+            total -= SAMPLE_OFFSET
+            self._dc = np.complex64(complex(*total))
+        return self._dc
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('Signals can only be sliced')
+
+        block = _to_complex(self.raw[key])
+        if self.remove_dc:
+            block -= self.dc
+        return block
+
+    def blocks(self, block_size=BLOCK_SIZE, start=0, stop=None):
+        """ Yield the signal (or the given range of it) as complex64 blocks so
+        that only one block is ever converted at a time.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        for offset in range(start, stop, block_size):
+            yield self[offset:min(offset + block_size, stop)]
+
+
+def iter_blocks(signal_path, block_size=BLOCK_SIZE):
+    """ Memory map the signal file and yield it as complex64 blocks. """
+    return Signal(signal_path).blocks(block_size)
+
+
+def read(config_path, sig_ext='.iq', cal_ext='.ciq', remove_dc=False):
+    """ Read the observation for the given config along with lazy `Signal`s
+    for its capture and calibration capture (if any).
+    """
     with open(config_path, 'r') as f:
         config = json.load(f)
 
@@ -26,39 +157,20 @@ def read(config_path, sig_ext='.iq', cal_ext='.ciq'):
 
     observation = Observation(**config, calibration=calibration)
 
-    directory = os.path.dirname(config_path)
-    name, _ = os.path.splitext(os.path.basename(config_path))
+    signal_path, calibration_path = get_paths(config_path, sig_ext, cal_ext)
+    signal = Signal(signal_path, remove_dc=remove_dc)
+    if calibration_path:
+        csignal = Signal(calibration_path, remove_dc=remove_dc)
+    else:
+        csignal = None
+
+    return observation, signal, csignal
 
-    def _get_signal():
-        signal_path = os.path.join(directory, f'{name}{sig_ext}')
-        return (
-            np.fromfile(signal_path, np.int16)
-            .astype(np.float32)
-            .view(np.complex64)
-        )
-
-    def _get_csignal():
-        calibration_path = os.path.join(directory, f'{name}{cal_ext}')
-        if os.path.exists(calibration_path):
-            return (
-                np.fromfile(calibration_path, np.int16)
-                .astype(np.float32)
-                .view(np.complex64)
-            )
-        else:
-            return None
-
-    return observation, _get_signal, _get_csignal
-
-
-def remove(config_path, sig_ext='.iq', cal_ext='.ciq'):
-    directory = os.path.dirname(config_path)
-    name, _ = os.path.splitext(os.path.basename(config_path))
-    signal_path = os.path.join(directory, f'{name}{sig_ext}')
-    os.remove(signal_path)
 
-    calibration_path = os.path.join(directory, f'{name}{cal_ext}')
-    if os.path.exists(calibration_path):
-        os.remove(calibration_path)
+def remove(config_path, sig_ext='.iq', cal_ext='.ciq', spec_ext='.psd'):
+    for ext in (sig_ext, cal_ext, spec_ext):
+        path = get_path(config_path, ext)
+        if os.path.exists(path):
+            os.remove(path)
 
     os.remove(config_path)
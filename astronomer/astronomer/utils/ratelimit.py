@@ -0,0 +1,107 @@
+""" Pace uploads to what the home server can take.
+
+Requests and bytes are each drawn from a token bucket. The rate of both is
+scaled by a single factor that backs off multiplicatively when the server
+signals that it is under pressure (a 429/503, or responses that are slow even
+allowing for the time it takes to send the request's body) and recovers
+additively while it keeps up, so a backlog drains as fast as the server allows
+without piling onto it when it is struggling.
+"""
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import threading
+import time
+
+from .. import settings
+
+
+# Statuses that ask us to slow down.
+BACKOFF_STATUS_CODES = (429, 503)
+
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take(self, amount, rate):
+        """ Take the tokens and return how long to wait before using them.
+        Requests larger than the bucket go into debt so they still get through
+        and later requests pay for them.
+        """
+        now = time.monotonic()
+        self.rate = rate
+        self._refill(now)
+        self.tokens -= amount
+        return max(0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+
+    def __init__(
+        self,
+        requests_per_second=settings.TRANSMIT_REQUESTS_PER_SECOND,
+        bytes_per_second=settings.TRANSMIT_BYTES_PER_SECOND,
+        target_latency=settings.TRANSMIT_TARGET_LATENCY,
+        min_factor=0.05,
+    ):
+        self.requests_per_second = requests_per_second
+        self.bytes_per_second = bytes_per_second
+        self.target_latency = target_latency
+        self.min_factor = min_factor
+        self.factor = 1
+        self.paused_until = 0
+        self.requests = TokenBucket(requests_per_second)
+        self.bytes = TokenBucket(bytes_per_second)
+        self.lock = threading.Lock()
+
+    def acquire(self, size=0):
+        """ Block until a request of `size` bytes fits in the budget. """
+        with self.lock:
+            delay = max(
+                self.paused_until - time.monotonic(),
+                self.requests.take(1, self.requests_per_second * self.factor),
+                self.bytes.take(size, self.bytes_per_second * self.factor),
+            )
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, status_code, latency=0, retry_after=None, size=0):
+        """ Adjust the rate given how the server responded to a request of
+        `size` bytes. The time the body should take at the current byte rate
+        doesn't count towards the latency.
+        """
+        with self.lock:
+            transfer_time = size / (self.bytes_per_second * self.factor)
+            if status_code in BACKOFF_STATUS_CODES:
+                self.factor = max(self.min_factor, self.factor / 2)
+                delay = get_retry_after(retry_after)
+                if delay:
+                    self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            elif latency - transfer_time > self.target_latency:
+                self.factor = max(self.min_factor, self.factor * 0.9)
+            else:
+                self.factor = min(1, self.factor + 0.05)
+
+
+def get_retry_after(value):
+    """ Parse a Retry-After header (in seconds or as a date) into seconds. """
+    if not value:
+        return None
+
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
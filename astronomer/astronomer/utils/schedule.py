@@ -0,0 +1,90 @@
+""" Decide which tasks to capture next and in what order.
+
+Every task that is active when a capture slot begins is captured once in that
+slot, so overlapping tasks share the device evenly. Tasks that need the same
+tuning are captured back to back and the groups are visited nearest frequency
+first, starting from wherever the device is tuned now. Since the next slot
+starts where this one ended, consecutive slots sweep back and forth across the
+band rather than jumping back to the start.
+"""
+from typing import List
+
+from .. import settings
+from ..models.task import Task
+from ..unsafe import db
+
+
+def get_default_task():
+    """ The capture taken when the server hasn't scheduled anything. """
+    return Task(
+        id=None,
+        frequency=settings.CAPTURE_FREQUENCY,
+        sample_rate=settings.CAPTURE_SAMPLE_RATE,
+        sample_size=settings.CAPTURE_SAMPLE_SIZE,
+        gain=settings.CAPTURE_GAIN,
+    )
+
+
+class ActiveTasks:
+    """ The tasks that are active now, cached until the next time a task
+    starts or ends. The cache is also dropped when the task table changes: by
+    calling `invalidate` after writing through the same connection, or
+    automatically when another connection (i.e. the downlink) commits.
+    Between those points a lookup only reads SQLite's data version counter.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.tasks = []
+        self.valid_from = None
+        self.valid_until = None
+        self.data_version = None
+
+    def invalidate(self):
+        self.valid_until = None
+
+    def _is_valid(self, now):
+        if self.valid_until is None or not self.valid_from <= now < self.valid_until:
+            return False
+        return db.get_data_version(self.connection) == self.data_version
+
+    def get(self, now) -> List[Task]:
+        now = db.to_timestamp(now)
+        if self._is_valid(now):
+            return self.tasks
+
+        with self.connection as cursor:
+            self.data_version = db.get_data_version(cursor)
+            self.tasks = [
+                Task.from_row(row)
+                for row in db.list_active_tasks(cursor, now)
+            ]
+            transitions = [task.end_at for task in self.tasks]
+            next_start = db.get_next_start(cursor, now)
+            if next_start is not None:
+                transitions.append(next_start)
+
+        self.valid_from = now
+        self.valid_until = min(transitions, default=float('inf'))
+        return self.tasks
+
+
+def plan(tasks: List[Task], tuning=None) -> List[Task]:
+    """ Order the tasks so the device is re-tuned as few times (and by as
+    little) as possible, given that it is currently at `tuning`.
+    """
+    groups = {}
+    for task in sorted(tasks, key=lambda task: str(task.id)):
+        groups.setdefault(task.tuning, []).append(task)
+
+    ordered = []
+    while groups:
+        if tuning in groups:
+            nearest = tuning
+        else:
+            frequency = tuning[0] if tuning else 0
+            nearest = min(groups, key=lambda key: (abs(key[0] - frequency), key))
+        ordered.extend(groups.pop(nearest))
+        tuning = nearest
+
+    return ordered
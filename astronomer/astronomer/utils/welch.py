@@ -0,0 +1,80 @@
+import numpy as np
+from matplotlib import mlab
+
+from . import calibration
+
+
+class Welch:
+    """ Accumulate the averaged periodogram of a signal one block at a time.
+    Each block is handed to `mlab.psd` and the per-block averages are combined
+    by segment count, so the result matches calling `mlab.psd` on the whole
+    signal while only ever holding a block in memory.
+    """
+
+    def __init__(self, NFFT=1024, Fs=2):
+        self.NFFT = NFFT
+        self.Fs = Fs
+        self.freqs = None
+        self.segments = 0
+        self._total = None
+        self._x = np.empty(0, dtype=np.complex64)
+
+    def add(self, x):
+        """ Add the next block of the signal. """
+        if self._x.size:
+            x = np.concatenate((self._x, x))
+
+        # Segments don't overlap, so any trailing partial segment is held on
+        # to until the next block arrives.
+        n = (x.size // self.NFFT) * self.NFFT
+        if n:
+            self._accumulate(x[:n])
+
+        self._x = x[n:].copy()
+
+    def _accumulate(self, x):
+        pxx, self.freqs = mlab.psd(x, NFFT=self.NFFT, Fs=self.Fs)
+
+        segments = max(1, x.size // self.NFFT)
+        if self._total is None:
+            self._total = pxx * segments
+        else:
+            self._total += pxx * segments
+        self.segments += segments
+
+    def result(self):
+        """ Return the averaged spectral density and its frequencies. """
+        if not self.segments:
+            if not self._x.size:
+                raise ValueError('Unable to compute the spectrum of an empty signal')
+            # Like mlab, a signal shorter than one segment is zero padded.
+            self._accumulate(self._x)
+        return self._total / self.segments, self.freqs
+
+
+def welch(blocks, NFFT=1024, Fs=2):
+    """ Compute the PSD of a signal given as an iterable of blocks. """
+    estimator = Welch(NFFT=NFFT, Fs=Fs)
+    for block in blocks:
+        estimator.add(block)
+    return estimator.result()
+
+
+def process_spectrum(observation, blocks, reference=None, NFFT=1024):
+    """ Compute the spectrum of an observation's signal from an iterable of
+    blocks, relative to the calibration's reference spectrum if given.
+    """
+    pxx, freqs = welch(
+        blocks,
+        NFFT=NFFT,
+        Fs=observation.sample_rate/1e6,
+    )
+    return calibrate(observation, pxx, freqs, reference)
+
+
+def calibrate(observation, pxx, freqs, reference=None):
+    """ Apply the calibration's reference spectrum (if any) to a spectrum. """
+    if reference is None:
+        return pxx, freqs
+
+    return calibration.apply(pxx, reference), freqs + observation.frequency / 1e6
@@ -1,55 +1,123 @@
+from contextlib import closing
 import time
 
-import httpx
-
 from .. import settings
+from ..models.event import Event
 from ..models.lights import StatusLight
 from ..mpsafe import managed_status
+from ..unsafe import db
 from ..utils import api
 
 
-# def configure(*args):
-#     configuration = api.get_configuration()
-#     with connection as cursor:
-#         db.truncate_tables(cursor)
-#         db.insert_telescope(configuration, cursor)
-#         for task in configuration['tasks']:
-#             db.insert_task(task, cursor)
-#
-#
-# def add_task(data):
-#     with connection as cursor:
-#         db.insert_task(data['task'], cursor)
-#
-#
-# def update_task(data):
-#     with connection as cursor:
-#         db.update_task(data['task'], cursor)
-#
-#
-# def delete_task(data):
-#     with connection.cursor() as cursor:
-#         db.delete_task(data['task'], cursor)
-
-
-def check_config():
-    # TODO: Add config check here. For now we just ping.
-    api.health_check()
+connection = None
+
+# The id of the last event applied to the local store. The stream resumes
+# from here after a reconnect so no changes are missed in between.
+last_event_id = None
+
+
+def configure(*args):
+    configuration = api.get_configuration()
+    with connection as cursor:
+        db.truncate_tables(cursor)
+        db.insert_telescope(configuration, cursor)
+        for task in configuration['tasks']:
+            # Unscheduled tasks arrive again in an update once they are.
+            if db.is_scheduled(task):
+                db.insert_task(task, cursor)
+
+
+def add_task(data):
+    if not db.is_scheduled(data['task']):
+        return
+
+    with connection as cursor:
+        db.insert_task(data['task'], cursor)
+
+
+def update_task(data):
+    with connection as cursor:
+        if not db.is_scheduled(data['task']):
+            # The task's schedule was cleared, so it can't run anymore.
+            db.delete_task(data['task'], cursor)
+        # The task may have been added to this telescope by the update.
+        elif db.update_task(data['task'], cursor).rowcount == 0:
+            db.insert_task(data['task'], cursor)
+
+
+def delete_task(data):
+    with connection as cursor:
+        db.delete_task(data['task'], cursor)
+
+
+HANDLERS = {
+    Event.Type.CONFIGURE: configure,
+    Event.Type.ADD_TASK: add_task,
+    Event.Type.UPDATE_TASK: update_task,
+    # The home server sends this when a task's configuration is edited.
+    'update': update_task,
+    Event.Type.DELETE_TASK: delete_task,
+}
+
+
+def handle_event(log, event):
+    if not event.is_message:
+        return
+
+    data = event.json
+    kind = data.get('type')
+    if kind == Event.Type.PING:
+        log.put(('debug', f'Received ping from host: {data.get("dt")}'))
+        return
+
+    try:
+        handler = HANDLERS[kind]
+    except KeyError:
+        log.put(('warning', f'Unknown downlink event: {kind}'))
+        return
+
+    log.put(('info', f'Applying downlink event: {kind}'))
+    handler(data)
 
 
 def downlink(log, event_queue):
-#     global connection
-#     connection = db.setup_and_connect()
+    global connection, last_event_id
+    connection = db.setup_and_connect()
 
     log.put(('info', 'Beginning downlink from host...'))
 
+    def resync():
+        log.put(('info', 'Fetching remote configuration...'))
+        configure()
+
     while True:
         with managed_status(event_queue, StatusLight.downlink) as light:
-            log.put(('info', 'Checking remote configuration...'))
             try:
-                check_config()
+                # Events sent while we weren't listening are lost, so start
+                # fresh from the full configuration. It is fetched once the
+                # stream is open so that changes made in the meantime are
+                # still delivered (and harmlessly reapplied) afterwards.
+                events = api.stream_events(
+                    last_event_id,
+                    on_connect=resync if last_event_id is None else None,
+                )
+                with closing(events):
+                    for event in events:
+                        try:
+                            handle_event(log, event)
+                        except Exception as e:
+                            light('flash_error')
+                            log.put(('error', f'Unable to apply downlink event: {e}.'))
+                            # Rather than replaying an event that can't be
+                            # applied, reconnect and start over from the full
+                            # configuration.
+                            last_event_id = None
+                            break
+
+                        if event.id:
+                            last_event_id = event.id
             except Exception as e:
                 light('flash_error')
                 log.put(('error', f'Downlink error: {e}.'))
 
-        time.sleep(settings.Wait.background)
+        time.sleep(settings.DOWNLINK_RECONNECT_SECONDS)
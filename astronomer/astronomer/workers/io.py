@@ -1,20 +1,92 @@
+from collections import deque
+import queue
+import time
+
 from .. import settings
 from ..models.lights import StatusLight
-from ..unsafe.io import register_event_callback, setup_dummy_server, IS_TEST_MODE, Light
-
-
-def process_light(name, value, lights, log):
-    if value is True:
-        method = 'on'
-    elif value is False:
-        method = 'off'
-    else:
-        method = value
-
+from ..unsafe.io import (
+    register_event_callback,
+    setup_dummy_server,
+    batch_updates,
+    IS_TEST_MODE,
+    Light,
+)
+
+
+class LightScheduler:
+    """ Play the animations for every light at once without blocking.
+
+    Each light has its own timeline of (state, seconds to hold it) steps and
+    the worker only sleeps until the next step that is due, so a slow flash on
+    one light never holds up the others. Requests queue up per light: a new
+    on/off replaces any on/off still waiting behind an animation (only the
+    last one would be visible anyway) and a repeat of the animation already
+    waiting is dropped. Pins are only written when their state changes.
+    """
+
+    def __init__(self, lights):
+        self.lights = lights
+        self.pending = {name: deque() for name in lights}
+        self.steps = {name: deque() for name in lights}
+        self.due = {name: 0 for name in lights}
+        # Lights start off (see `Light.__init__`).
+        self.state = {name: False for name in lights}
+        self.collapsed = 0
+
+    def add(self, name, value):
+        if value is True:
+            method = 'on'
+        elif value is False:
+            method = 'off'
+        else:
+            method = value
+
+        animation = self.lights[name].get_animation(method)
+        pending = self.pending[name]
+        if len(animation) == 1:
+            while pending and len(pending[-1]) == 1:
+                pending.pop()
+                self.collapsed += 1
+        elif pending and pending[-1] == animation:
+            self.collapsed += 1
+            return
+        pending.append(animation)
+
+    def tick(self, now):
+        """ Play every step that is due and return the seconds until the next
+        one (or None if nothing is playing).
+        """
+        with batch_updates():
+            return self._tick(now)
+
+    def _tick(self, now):
+        wait = None
+        for name, light in self.lights.items():
+            steps = self.steps[name]
+            while self.due[name] <= now:
+                if not steps:
+                    if not self.pending[name]:
+                        break
+                    steps.extend(self.pending[name].popleft())
+
+                state, delay = steps.popleft()
+                if self.state.get(name) != state:
+                    light.set(state)
+                    self.state[name] = state
+                self.due[name] = now + delay
+
+            if steps or self.pending[name]:
+                delay = max(0, self.due[name] - now)
+                wait = delay if wait is None else min(wait, delay)
+        return wait
+
+
+def get_depth(event_queue):
     try:
-        getattr(lights[name], method)()
-    except KeyError:
-        log.put(('warn', f'No method on light found for method: {method}'))
+        return event_queue.qsize()
+    except NotImplementedError:
+        # Not available on every platform (e.g. macOS).
+        return None
 
 
 def handle_io(log, event_queue, should_calibrate, should_observe):
@@ -54,19 +126,42 @@ def handle_io(log, event_queue, should_calibrate, should_observe):
         else:
             should_observe.set()
 
-    # TODO: Make more concurrent for multiple lights at the same time.
-
     register_event_callback(
         settings.CAPTURE_OBSERVE_INPUT_CHANNEL,
         toggle_should_observe,
     )
 
     log.put(('info', '[I/O] Listening...'))
+    scheduler = LightScheduler(lights)
     while True:
-        kind, name, value = event_queue.get()
-        if kind == 'light':
-            log.put(('debug', f'[I/O] {kind}({name=}, {value=})'))
-            process_light(name, value, lights, log)
-        else:
-            log.put(('warn', f'[I/O] Unknown Event: {kind}({name=}, {value=})'))
-
+        timeout = scheduler.tick(time.monotonic())
+        try:
+            events = [event_queue.get(timeout=timeout)]
+        except queue.Empty:
+            continue
+
+        # Take everything that has built up so a burst is collapsed before
+        # any of it is played.
+        while len(events) < settings.IO_MAX_EVENT_BATCH:
+            try:
+                events.append(event_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        collapsed = scheduler.collapsed
+        for kind, name, value in events:
+            if kind == 'light':
+                log.put(('debug', f'[I/O] {kind}({name=}, {value=})'))
+                try:
+                    scheduler.add(name, value)
+                except KeyError:
+                    log.put(('warn', f'No method on light found for method: {value}'))
+            else:
+                log.put(('warn', f'[I/O] Unknown Event: {kind}({name=}, {value=})'))
+
+        if len(events) > 1:
+            log.put(('debug', (
+                f'[I/O] Handled {len(events)} events '
+                f'({scheduler.collapsed - collapsed} collapsed, '
+                f'{get_depth(event_queue)} still queued).'
+            )))
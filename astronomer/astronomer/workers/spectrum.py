@@ -1,22 +1,25 @@
 from datetime import datetime
 import os
 import time
-import shutil
 import tempfile
 
 import numpy as np
 from matplotlib import pyplot as plt
-from matplotlib import mlab
 
 from .. import settings
-from ..utils import iqd
+from ..utils import calibration, handoff, iqd
+from ..utils.welch import calibrate, process_spectrum
 from ..models.lights import StatusLight
 from ..models.buffer import FixedBuffer
 from ..mpsafe import managed_status
 
 
 cache = {}
-signal_buffer = FixedBuffer(settings.SIGNAL_BUFFER_LENGTH)
+# Spectra are only integrated with others of the same configuration and
+# tuning, as the schedule interleaves readings of different parts of the sky.
+signal_buffers: dict[tuple, FixedBuffer] = {}
+
+SPECTRUM_FILE_EXTENSION = '.psd'
 
 
 def setup(log):
@@ -25,28 +28,21 @@ def setup(log):
     return True
 
 
-def process_spectrum(observation, signal, c_signal, NFFT=1024):
-    Fc = observation.frequency / 1e6
-
-    if c_signal is not None:
-        pxx, freqs = mlab.csd(
-            signal,
-            c_signal,
-            NFFT=1024,
-            Fs=observation.sample_rate/1e6,
-        )
-        freqs += Fc
-    else:
-        pxx, freqs = mlab.psd(
-            signal,
-            NFFT=1024,
-            Fs=observation.sample_rate/1e6,
+def get_buffer(observation):
+    """ The buffer that integrates spectra like the observation's. Calibrated
+    values are kept apart from raw ones as they're on a different scale.
+    """
+    key = (observation.configuration, observation.tuning, bool(observation.calibration))
+    if key not in signal_buffers:
+        signal_buffers[key] = FixedBuffer(
+            settings.SIGNAL_BUFFER_LENGTH,
+            mode=settings.SIGNAL_BUFFER_MODE,
+            decay=settings.SIGNAL_BUFFER_DECAY,
         )
-
-    return pxx, freqs
+    return signal_buffers[key]
 
 
-def plot_to_image(log, values, freq, observation, buff_percent):
+def plot_to_image(log, values, freq, observation, buffer):
     with tempfile.NamedTemporaryFile('wb+', suffix='.png') as f:
         log.put(('debug', f'Using NTF: {f.name}'))
 
@@ -54,13 +50,13 @@ def plot_to_image(log, values, freq, observation, buff_percent):
         l = len(values)
         center = l // 2
         width = 4
-        values[center-width:center+width] = values[center-width:center+width] / (signal_buffer.length * 10)
+        values[center-width:center+width] = values[center-width:center+width] / (buffer.length * 10)
         # END HACK
 
         title = observation.identifier
         if observation.calibration:
             title += ' (Calibrated)'
-        title += f' (Buffer {int(buff_percent*100)}%)'
+        title += f' (Buffer {int(buffer.percent_full*100)}%)'
 
         plt.title(title)
         plt.plot(freq, values)
@@ -97,45 +93,60 @@ def write_spectrum(
 def check_observations(
     log,
     event_queue,
+    paths=None,
+    spectrum_queue=None,
     input_directory=settings.CAPTURE_DATA_PATH,
     output_directory=settings.SPECTRUM_DATA_PATH,
     batch_size=settings.SPECTRUM_BATCH_SIZE,
 ):
-    config_files = [
-        (os.path.join(input_directory, filename), filename)
-        for filename in os.listdir(input_directory)
-        if filename.endswith('.json')
-    ]
+    if paths is None:
+        paths = handoff.scan(input_directory)[:batch_size or None]
 
-    if not batch_size:
-        batch_size = len(config_files)
+    for path in paths:
+        filename = os.path.basename(path)
+        if not os.path.exists(path):
+            # Already processed (e.g. found by the startup scan as well).
+            continue
 
-    for path, filename in config_files[:batch_size]:
         with managed_status(event_queue, StatusLight.analysis):
             log.put(('info', f'Processing {filename}...'))
             try:
-                observation, get_signal, get_c_signal = iqd.read(path)
+                observation, signal, _ = iqd.read(
+                    path,
+                    remove_dc=settings.SPECTRUM_REMOVE_DC,
+                )
+                spectrum_path = iqd.get_path(path, SPECTRUM_FILE_EXTENSION)
             except Exception as e:
                 log.put(('error', f'Unable to fetch data for {filename}. {e=}. Purging.'))
                 continue
 
             log.put(('info', f'Processing {observation.summary}'))
 
-            signal = get_signal()
-
-            if calibration := observation.calibration:
-                c_signal = get_c_signal()
-            else:
-                c_signal = None
+            reference = None
+            if observation.calibration:
+                reference = calibration.load(observation.calibration.identifier)
+                if reference is None:
+                    log.put(('warning', f'Missing calibration for {filename}. Skipping...'))
+                    iqd.remove(path)
+                    continue
 
-            if c_signal is not None and len(c_signal) != len(signal):
-                log.put(('warning', f'Signal length differed from calibration length. Skipping...'))
+            try:
+                if os.path.exists(spectrum_path):
+                    # The capture was already integrated as it was recorded.
+                    values, freq = calibrate(
+                        observation,
+                        *iqd.read_spectrum(spectrum_path),
+                        reference,
+                    )
+                else:
+                    values, freq = process_spectrum(observation, signal.blocks(), reference)
+            except ValueError as e:
+                log.put(('warning', f'{e}. Skipping...'))
                 iqd.remove(path)
                 continue
-
-            values, freq = process_spectrum(observation, signal, c_signal)
-            signal_buffer.add(values)
-            pxx = np.sum(signal_buffer.get_data(), axis=0)
+            buffer = get_buffer(observation)
+            buffer.add(values)
+            pxx = buffer.integrated
 
             write_spectrum(
                 log,
@@ -143,29 +154,43 @@ def check_observations(
                 pxx,
                 None,
                 freq,
-                plot_to_image(log, pxx, freq, observation, signal_buffer.percent_full),
+                plot_to_image(log, pxx, freq, observation, buffer),
                 output_directory,
             )
-            config_output_path = os.path.join(output_directory, os.path.basename(path))
-            shutil.copyfile(path, config_output_path)
+            # The config is written last as it signals that the sample is
+            # complete.
+            config_output_path = os.path.join(output_directory, filename)
+            handoff.copy(path, config_output_path)
+            handoff.publish(spectrum_queue, config_output_path)
             log.put(('info', f'Finished processing {filename}. Purging.'))
             iqd.remove(path)
 
 
-def loop(log, event_queue):
-    check_observations(log, event_queue)
+def loop(log, event_queue, capture_queue=None, spectrum_queue=None):
+    if capture_queue is None:
+        check_observations(log, event_queue, spectrum_queue=spectrum_queue)
+        time.sleep(settings.Wait.processing)
+    else:
+        paths = handoff.wait(capture_queue, limit=settings.SPECTRUM_BATCH_SIZE)
+        check_observations(log, event_queue, paths, spectrum_queue)
 
 
-def analyze_spectra(log, event_queue):
+def analyze_spectra(log, event_queue, capture_queue=None, spectrum_queue=None):
     """ Continuously watch the sky and record values to disk. """
     if setup(log):
         log.put(('info', 'Analyzing spectra...'))
         try:
+            # Recover anything captured while we weren't listening.
+            check_observations(
+                log,
+                event_queue,
+                handoff.scan(settings.CAPTURE_DATA_PATH),
+                spectrum_queue,
+            )
             while True:
                 log.put(('debug', 'Begin spectra iteration...'))
-                loop(log, event_queue)
-                log.put(('debug', 'End spectra iteration. Sleeping...'))
-                time.sleep(settings.Wait.processing)
+                loop(log, event_queue, capture_queue, spectrum_queue)
+                log.put(('debug', 'End spectra iteration.'))
         except Exception as e:
             log.put(('error', f'Encountered error during analysis. {e}. Exiting...'))
             event_queue.put((StatusLight.analysis, 'flash_error'))
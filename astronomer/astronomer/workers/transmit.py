@@ -3,7 +3,6 @@ import logging
 import os
 import os.path
 import json
-import random
 import shutil
 from subprocess import CalledProcessError
 import time
@@ -11,11 +10,15 @@ import time
 import httpx
 
 from .. import settings
-from ..utils import api
+from ..utils import api, handoff
 from ..mpsafe import managed_status
 from ..models.lights import StatusLight
 
 
+# The files that make up a complete sample.
+SAMPLE_FILE_EXTENSIONS = ('.dat', '.json', '.png')
+
+
 def ping_home(log):
     log.put(('debug', f'Attempting to ping {settings.HOME_API_HEALTH_CHECK_URL}...'))
     return True # TODO
@@ -25,17 +28,42 @@ def ping_home(log):
         return False
 
 
+def index_files(directory=settings.SPECTRUM_DATA_PATH):
+    """ Group the files in the directory by the sample identifier they belong
+    to, oldest sample first.
+    """
+    index = {}
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        identifier, ext = os.path.splitext(entry.name)
+        if ext == handoff.TEMPORARY_FILE_EXTENSION:
+            continue
+        index.setdefault(identifier, []).append(entry.path)
+    return index
+
+
+def config_files(index):
+    """ The config of every sample in the index, oldest first. """
+    return [
+        path
+        for paths in index.values()
+        for path in paths
+        if path.endswith(handoff.CONFIG_FILE_EXTENSION)
+    ]
+
+
 def loop(
     log,
     event_queue,
+    files=None,
     batch_size=settings.TRANSMIT_BATCH_SIZE,
-    total_associated_files_per_sample=3,
+    extensions=SAMPLE_FILE_EXTENSIONS,
+    index=None,
 ):
-    files = [
-        os.path.join(settings.SPECTRUM_DATA_PATH, file)
-        for file in sorted(os.listdir(settings.SPECTRUM_DATA_PATH))
-        if file.endswith('.json')
-    ]
+    if index is None:
+        index = index_files()
+
+    if files is None:
+        files = config_files(index)
 
     if not files:
         log.put(('debug', 'No data files found.'))
@@ -43,7 +71,13 @@ def loop(
 
     batch = files[:batch_size]
     log.put(('info', f'Found {len(files)} total to transmit. Uploading {len(batch)}.'))
+    samples = []
+    partial = []
     for path in batch:
+        if not os.path.exists(path):
+            # Already transmitted (e.g. found by the startup scan as well).
+            continue
+
         with open(path) as f:
             config = json.load(f)
 
@@ -53,20 +87,29 @@ def loop(
             os.remove(path)
             continue
 
-        # Find all related files
+        associated_files = index.get(identifier, [path])
+        found = {os.path.splitext(file)[1] for file in associated_files}
+        if not found.issuperset(extensions):
+            partial.append(identifier)
 
-        associated_files = [
-            os.path.join(settings.SPECTRUM_DATA_PATH, file)
-            for file in os.listdir(settings.SPECTRUM_DATA_PATH)
-            if identifier in file
-        ]
+        samples.append((identifier, associated_files))
+
+    if partial:
+        log.put((
+            'error',
+            f'Found {len(partial)} malformed samples ({", ".join(partial)}). '
+            'Uploading partial data.'
+        ))
 
-        if len(associated_files) != total_associated_files_per_sample:
-            log.put(('error', 'Found malformed sample. Uploading partial data.'))
+    if settings.TRANSMIT_BACKEND == 'http':
+        upload_samples(log, event_queue, samples)
+        return
 
+    for identifier, associated_files in samples:
         log.put(('info', f'Transmitting sample ({identifier}) to remote host...'))
         try:
             for path in associated_files:
+                api.get_limiter().acquire(os.path.getsize(path))
                 with managed_status(event_queue, StatusLight.transmit):
                     api.upload_observation(path)
         except CalledProcessError as e:
@@ -83,12 +126,44 @@ def loop(
             log.put(('info', 'Transmission complete.'))
             event_queue.put((StatusLight.analysis, 'flash_ok'))
 
-        # Sleep for a while to not overload the server.
-        time.sleep(random.randint(0, 10))
+
+def upload_samples(log, event_queue, samples):
+    """ Upload the files of every sample in the batch concurrently over the
+    shared uploader, then purge each sample whose files were all sent.
+    """
+    paths = [path for _, associated_files in samples for path in associated_files]
+    log.put(('info', f'Transmitting {len(samples)} samples ({len(paths)} files) to remote host...'))
+
+    errors = {}
+    with managed_status(event_queue, StatusLight.transmit) as light:
+        for path, error in api.get_uploader().upload_all(paths):
+            if error is not None:
+                errors[path] = error
+
+        if errors:
+            light('flash_error')
+        else:
+            light('flash_ok')
+
+    for identifier, associated_files in samples:
+        failures = [path for path in associated_files if path in errors]
+        if failures:
+            log.put((
+                'warning',
+                f'Transmission failure: {identifier}. '
+                f'Exception thrown during transmision: {errors[failures[0]]}'
+            ))
+            continue
+
+        for path in associated_files:
+            os.remove(path)
+        log.put(('info', f'Transmission complete: {identifier}.'))
 
 
-def transmit(log, event_queue):
-    """ Search the given spectrum data path and upload whatever is found there. """
+def transmit(log, event_queue, spectrum_queue=None):
+    """ Upload each sample as the spectrum worker publishes it, starting with
+    whatever is already in the spectrum data path.
+    """
     while not ping_home(log):
         log.put((
             'error',
@@ -97,14 +172,34 @@ def transmit(log, event_queue):
         ))
         time.sleep(settings.Wait.background)
 
+    # Recover anything processed while we weren't listening. The directory is
+    # only listed again when new samples arrive, not for every batch.
+    index = index_files()
+    pending = config_files(index)
     while True:
+        if spectrum_queue is not None and not pending:
+            pending = handoff.wait(spectrum_queue)
+            if pending:
+                index = index_files()
+        batch_size = settings.TRANSMIT_BATCH_SIZE
+        batch, pending = pending[:batch_size], pending[batch_size:]
+
         log.put(('debug', 'Beginning transmission...'))
         try:
-            loop(log, event_queue)
+            loop(log, event_queue, batch, index=index)
         except Exception as e:
             log.put(('warning', f'Received error: {e}. Retrying...'))
+            pending = None
         finally:
             log.put(('debug', 'Ending transmission. Sleeping...'))
-        time.sleep(settings.Wait.background)
+
+        if any(os.path.exists(path) for path in batch):
+            # Anything that failed to send is retried by the next scan.
+            pending = None
+
+        if spectrum_queue is None or pending is None:
+            time.sleep(settings.Wait.background)
+            index = index_files()
+            pending = config_files(index)
 
     log.put(('info', 'Done'))
@@ -1,36 +1,50 @@
 from base64 import b64encode
+from contextlib import nullcontext
 from datetime import datetime
 import os
-import shutil
 import time
 
-from rtlsdr import RtlSdr, rtlsdr
-
 from .. import settings
 from ..models.lights import StatusLight
 from ..models.observation import Observation, Calibration
 from ..mpsafe import managed_status
+from ..unsafe import db
 from ..unsafe.devices import DefaultDevice
-from ..utils import iqd
+from ..utils import calibration as calibration_store, handoff, iqd, schedule
+from ..utils.welch import process_spectrum
 
 
 device: DefaultDevice = None
-calibration: Calibration = None
-calibration_signal_path = None
+active_tasks: schedule.ActiveTasks = None
+
+# The settings the device was last tuned to, so that the schedule can start
+# with the tasks that don't need it re-tuned.
+tuning = None
+
+# The latest calibration taken at each tuning. A reference spectrum only
+# applies to readings taken with the same settings.
+calibrations: dict[tuple, Calibration] = {}
 
 
 CALIBRATION_FILE_EXTENSION = '.ciq'
 SIGNAL_FILE_EXTENSION = '.iq'
+SPECTRUM_FILE_EXTENSION = '.psd'
 CONFIG_FILE_EXTENSION = '.json'
 
 
-def setup(log, event_queue, test_mode=False, bias_tee=False):
+def setup(log, event_queue, test_mode=False, bias_tee=False, streaming=False):
     # Connect to SDR
     if test_mode:
         log.put(('info', 'Test SDR mode: enabled'))
+    elif streaming:
+        log.put(('info', 'Streaming SDR mode: enabled'))
     global device
     try:
-        device = DefaultDevice(test_mode=test_mode, bias_tee=bias_tee)
+        device = DefaultDevice(
+            test_mode=test_mode,
+            bias_tee=bias_tee,
+            streaming=streaming,
+        )
     except Exception as e:
         log.put(('critical', f'Unable to use SDR: {e}'))
         return False
@@ -38,6 +52,8 @@ def setup(log, event_queue, test_mode=False, bias_tee=False):
     # Setup data directories
     os.makedirs(settings.CAPTURE_DATA_PATH, exist_ok=True)
     os.makedirs(settings.CALIBRATION_DATA_PATH, exist_ok=True)
+    if settings.CAPTURE_KEEP_RAW:
+        os.makedirs(settings.CAPTURE_RAW_DATA_PATH, exist_ok=True)
 
     # Test SDR Connection
     with managed_status(
@@ -76,7 +92,21 @@ def warm_up(
     )
 
 
-def take_calibration_reading(log, *args, c_ext=CALIBRATION_FILE_EXTENSION, **kwargs):
+def get_tuning(frequency, sample_rate, gain=0, ppm=0, **kwargs):
+    """ The key of a reading's settings, matching `Task.tuning`. """
+    return (frequency, sample_rate, gain, ppm or 0)
+
+
+def take_calibration_reading(
+    log,
+    *args,
+    c_ext=CALIBRATION_FILE_EXTENSION,
+    NFFT=1024,
+    **kwargs,
+):
+    """ Take a calibration reading and store its reference spectrum. The raw
+    signal is only needed until the reference has been computed.
+    """
     log.put(('info', '[Calibration] Begin...'))
     observation, signal_path = take_reading(
         log,
@@ -84,12 +114,23 @@ def take_calibration_reading(log, *args, c_ext=CALIBRATION_FILE_EXTENSION, **kwa
         directory=settings.CALIBRATION_DATA_PATH,
         signal_ext=c_ext,
         use_calibration=False,
-        **kwargs,
+        **{**kwargs, 'configuration': None},
+    )
+
+    # The reference is made the same way as the spectra it is applied to.
+    values, freqs = process_spectrum(
+        observation,
+        iqd.Signal(signal_path, remove_dc=settings.SPECTRUM_REMOVE_DC).blocks(),
+        NFFT=NFFT,
     )
-    global calibration
-    calibration = observation
-    global calibration_signal_path
-    calibration_signal_path = signal_path
+    calibration_store.save(observation, values, freqs)
+    iqd.remove(
+        iqd.get_path(signal_path, CONFIG_FILE_EXTENSION),
+        sig_ext=c_ext,
+    )
+
+    calibrations[get_tuning(**kwargs)] = observation
+    calibration_store.prune(keep={c.identifier for c in calibrations.values()})
     log.put(('info', '[Calibration] End.'))
 
 
@@ -101,11 +142,12 @@ def take_reading(
     gain=0,
     n=1,
     bandwidth=1,
+    ppm=0,
     ts=None,
+    configuration=None,
     use_calibration=True,
     signal_ext=SIGNAL_FILE_EXTENSION,
     config_ext=CONFIG_FILE_EXTENSION,
-    c_ext=CALIBRATION_FILE_EXTENSION,
     directory=settings.CAPTURE_DATA_PATH,
 ) -> (Observation, str):
     """ Take a reading from the device given the settings provided
@@ -125,6 +167,7 @@ def take_reading(
         frequency=frequency,
         gain=gain,
         bandwidth=bandwidth,
+        ppm=ppm,
         n=n,
     )
 
@@ -136,16 +179,16 @@ def take_reading(
         sample_rate=sample_rate,
         gain=gain,
         bandwidth=bandwidth,
+        ppm=ppm,
         timestamp=datetime.utcnow().isoformat(),
+        configuration=configuration,
     )
 
-    if use_calibration and calibration is not None:
-        log.put(('debug', 'Copying calibration data...'))
-        observation.calibration = calibration
-
-        c_signal_filename = f'{identifier}{c_ext}'
-        c_signal_path = os.path.join(directory, c_signal_filename)
-        shutil.copyfile(calibration_signal_path, c_signal_path)
+    if use_calibration:
+        # The calibration's reference spectrum is found by its identifier.
+        observation.calibration = calibrations.get(
+            get_tuning(frequency, sample_rate, gain, ppm),
+        )
 
     log.put(('debug', 'Writing config data to disk...'))
     observation_filename = f'{identifier}{config_ext}'
@@ -154,36 +197,151 @@ def take_reading(
     return observation, signal_path
 
 
-def loop(log, event_queue, should_calibrate, should_observe):
+def take_integrated_reading(
+    log,
+    identifier,
+    frequency,
+    sample_rate,
+    gain=0,
+    n=1,
+    bandwidth=1,
+    ppm=0,
+    ts=None,
+    configuration=None,
+    use_calibration=True,
+    NFFT=1024,
+    keep_raw=settings.CAPTURE_KEEP_RAW,
+    spectrum_ext=SPECTRUM_FILE_EXTENSION,
+    signal_ext=SIGNAL_FILE_EXTENSION,
+    config_ext=CONFIG_FILE_EXTENSION,
+    directory=settings.CAPTURE_DATA_PATH,
+    raw_directory=settings.CAPTURE_RAW_DATA_PATH,
+) -> (Observation, str):
+    """ Take a reading from the device and integrate it into a spectrum as the
+    samples arrive, so that only the spectrum (and optionally the raw signal)
+    is ever written to disk.
+    """
+    estimated_time = n // sample_rate
+    log.put(('debug', f'Integrating data from device {n=}, {estimated_time=}s...'))
+
+    observation = Observation(
+        identifier=identifier,
+        frequency=frequency,
+        sample_rate=sample_rate,
+        gain=gain,
+        bandwidth=bandwidth,
+        ppm=ppm,
+        timestamp=datetime.utcnow().isoformat(),
+        configuration=configuration,
+    )
+
+    if use_calibration:
+        observation.calibration = calibrations.get(
+            get_tuning(frequency, sample_rate, gain, ppm),
+        )
+
+    def _get_blocks(raw_file):
+        for chunk in device.stream(
+            n,
+            sample_rate=sample_rate,
+            frequency=frequency,
+            gain=gain,
+            bandwidth=bandwidth,
+            ppm=ppm,
+        ):
+            if raw_file:
+                raw_file.write(chunk)
+            yield iqd.to_complex(chunk)
+
+    raw_path = os.path.join(raw_directory, f'{identifier}{signal_ext}') if keep_raw else None
+    with open(raw_path, 'wb') if raw_path else nullcontext() as raw_file:
+        # The calibration is applied when the spectrum is processed.
+        values, freqs = process_spectrum(
+            observation,
+            _get_blocks(raw_file),
+            NFFT=NFFT,
+        )
+
+    log.put(('debug', 'Writing spectrum data to disk...'))
+    spectrum_path = os.path.join(directory, f'{identifier}{spectrum_ext}')
+    iqd.write_spectrum(spectrum_path, values, freqs)
+
+    # The config is written last as it signals that the reading is complete.
+    observation_path = os.path.join(directory, f'{identifier}{config_ext}')
+    iqd.write_config(observation_path, observation)
+    return observation, spectrum_path
+
+
+def get_reading_kwargs(task):
     now = datetime.utcnow()
     short_now = now.strftime('%Y-%m-%dT%H-%M-%S-%f%Z')
 
-    kwargs = dict(
+    return dict(
         identifier=f'sample-{short_now}',
-        frequency=settings.CAPTURE_FREQUENCY,
-        sample_rate=settings.CAPTURE_SAMPLE_RATE,
-        gain=settings.CAPTURE_GAIN,
-        n=settings.CAPTURE_SAMPLE_SIZE,
+        frequency=task.frequency,
+        sample_rate=task.sample_rate,
+        gain=task.gain,
+        n=int(task.sample_size),
         bandwidth=settings.CAPTURE_BANDWIDTH,
+        ppm=task.ppm or 0,
         ts=now,
+        configuration=task.id,
     )
 
+
+def get_tasks(log):
+    """ Return the tasks to capture this slot in the order to capture them.
+    Without any scheduled tasks the telescope keeps capturing with the default
+    settings.
+    """
+    tasks = active_tasks.get(datetime.utcnow())
+    if not tasks:
+        return [schedule.get_default_task()]
+
+    log.put(('debug', f'Scheduled {len(tasks)} active task(s).'))
+    return schedule.plan(tasks, tuning)
+
+
+def loop(log, event_queue, should_calibrate, should_observe, capture_queue=None):
+    global tuning
+    tasks = get_tasks(log)
+
     try:
         if should_calibrate.is_set():
             with managed_status(event_queue, StatusLight.calibrate):
-                take_calibration_reading(log, **kwargs)
+                # Take a reference for each of the settings about to be used.
+                for task in {task.tuning: task for task in tasks}.values():
+                    take_calibration_reading(log, **get_reading_kwargs(task))
+                    tuning = task.tuning
                 should_calibrate.clear()
-        if should_observe.is_set():
+        for task in tasks:
+            if not should_observe.is_set():
+                break
             with managed_status(event_queue, StatusLight.capture):
-                take_reading(log, **kwargs)
+                kwargs = get_reading_kwargs(task)
+                if settings.CAPTURE_FUSED_MODE_ENABLED:
+                    _, path = take_integrated_reading(log, **kwargs)
+                else:
+                    _, path = take_reading(log, **kwargs)
+                tuning = task.tuning
+            # The config is in place, so the reading is ready to process.
+            handoff.publish(capture_queue, iqd.get_path(path, CONFIG_FILE_EXTENSION))
     except Exception as e:
         log.put(('error', f'Failed to take reading. {e}'))
         raise e
 
 
-def watch_sky(log, event_queue, should_calibrate, should_observe):
+def watch_sky(log, event_queue, should_calibrate, should_observe, capture_queue=None):
     """ Continuously watch the sky and record values to disk. """
-    if setup(log, event_queue, settings.CAPTURE_TEST_MODE_ENABLED):
+    global active_tasks
+    active_tasks = schedule.ActiveTasks(db.setup_and_connect())
+
+    if setup(
+        log,
+        event_queue,
+        settings.CAPTURE_TEST_MODE_ENABLED,
+        streaming=settings.CAPTURE_STREAMING_ENABLED,
+    ):
         try:
             with managed_status(event_queue, StatusLight.capture):
                 warm_up(
@@ -196,7 +354,7 @@ def watch_sky(log, event_queue, should_calibrate, should_observe):
             log.put(('info', 'Capturing data...'))
             while True:
                 log.put(('debug', 'Begin data capture iteration...'))
-                loop(log, event_queue, should_calibrate, should_observe)
+                loop(log, event_queue, should_calibrate, should_observe, capture_queue)
                 log.put(('debug', 'End data capture iteration. Sleeping...'))
                 time.sleep(settings.Wait.device)
         except KeyboardInterrupt:
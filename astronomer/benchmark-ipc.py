@@ -0,0 +1,93 @@
+""" Measure the per-message latency of the channels the workers log and post
+status events through, with several producers putting at once.
+
+    python benchmark-ipc.py [--producers 4] [--messages 5000] [--rate 0]
+
+Put time is how long a producer is held up by each put. Delivery latency is
+the time from a put until the consumer gets the message. By default producers
+put as fast as they can, which measures the channel saturated. Give a `--rate`
+(in messages per second per producer) to measure it at a steady load.
+"""
+import argparse
+from multiprocessing import Manager, Process, Queue, SimpleQueue
+import statistics
+import time
+
+
+def produce(name, queue, messages, results, rate=0):
+    put_times = []
+    interval = 1 / rate if rate else 0
+    next_at = time.perf_counter()
+    for i in range(messages):
+        if interval:
+            next_at += interval
+            time.sleep(max(0, next_at - time.perf_counter()))
+        start = time.perf_counter()
+        queue.put(('debug', f'Message {i}', time.perf_counter()))
+        put_times.append(time.perf_counter() - start)
+    results.put((name, 'put', put_times))
+
+
+def consume(name, queue, total, results):
+    latencies = []
+    for _ in range(total):
+        *_, sent = queue.get()
+        latencies.append(time.perf_counter() - sent)
+    results.put((name, 'delivery', latencies))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(name, queue, producers, messages, rate=0):
+    results = Queue()
+    consumer = Process(target=consume, args=(name, queue, producers * messages, results))
+    consumer.start()
+    workers = [
+        Process(target=produce, args=(name, queue, messages, results, rate))
+        for _ in range(producers)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    # Results arrive in whatever order the processes finish, so each is
+    # tagged with the run and measurement it belongs to.
+    timings = {'put': [], 'delivery': []}
+    for _ in range(len(workers) + 1):
+        run_name, kind, values = results.get()
+        assert run_name == name, f'Got results for {run_name} during {name}.'
+        timings[kind].extend(values)
+    elapsed = time.perf_counter() - start
+    put_times, latencies = timings['put'], timings['delivery']
+
+    for worker in workers + [consumer]:
+        worker.join()
+
+    print(
+        f'{name:<16}'
+        f'put p50={statistics.median(put_times) * 1e6:8.1f}us '
+        f'p99={percentile(put_times, 0.99) * 1e6:8.1f}us  '
+        f'delivery p50={statistics.median(latencies) * 1e6:10.1f}us '
+        f'p99={percentile(latencies, 0.99) * 1e6:10.1f}us  '
+        f'{producers * messages / elapsed:9.0f} msg/s'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--producers', default=4, type=int)
+    parser.add_argument('--messages', default=5000, type=int)
+    parser.add_argument('--rate', default=0, type=float)
+    args = parser.parse_args()
+
+    with Manager() as manager:
+        run('Manager.Queue', manager.Queue(), args.producers, args.messages, args.rate)
+    run('Queue', Queue(), args.producers, args.messages, args.rate)
+    run('SimpleQueue', SimpleQueue(), args.producers, args.messages, args.rate)
+
+
+if __name__ == '__main__':
+    main()
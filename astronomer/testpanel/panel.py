@@ -111,43 +111,53 @@ class App(tk.Frame):
         self.downlink_canvas.configure(bg='yellow' if state else 'black')
 
 
+# Messages travel as UDP datagrams, each holding one or more newline separated
+# messages, so a batch of light changes arrives (and is drawn) at once.
+MESSAGE_SEPARATOR = b'\n'
+MAX_DATAGRAM_SIZE = 4096
+
+send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+
 def get_socket_server(app):
     print('Starting socket client...')
+    setters = {
+        CALIBRATE_STATUS_PIN: app.set_calibrate,
+        CAPTURE_STATUS_PIN: app.set_capture,
+        TRANSMIT_STATUS_PIN: app.set_transmit,
+        SPECTRUM_STATUS_PIN: app.set_spectrum,
+        DOWNLINK_STATUS_PIN: app.set_downlink,
+    }
+
     def _server():
-        soc = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        soc = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         soc.bind((HOST, RECV_PORT))
         while True:
-            soc.listen(5)
-            client, address = soc.accept()
-            response = client.recv(255)
-            try:
-                pin, state = response.split(b'-')
-            except ValueError:
-                print(f'invalid response: {response}')
-                continue
-
-            pin, state = int(pin), int(state)
-            if pin == CALIBRATE_STATUS_PIN:
-                app.set_calibrate(state)
-            elif pin == CAPTURE_STATUS_PIN:
-                app.set_capture(state)
-            elif pin == TRANSMIT_STATUS_PIN:
-                app.set_transmit(state)
-            elif pin == SPECTRUM_STATUS_PIN:
-                app.set_spectrum(state)
-            elif pin == DOWNLINK_STATUS_PIN:
-                app.set_downlink(state)
-            else:
-                print(f'Unknown {pin=}: {state}')
+            data, address = soc.recvfrom(MAX_DATAGRAM_SIZE)
+
+            # Only the last state of each light in the batch is shown.
+            states = {}
+            for message in data.split(MESSAGE_SEPARATOR):
+                if not message:
+                    continue
+                try:
+                    pin, state = message.split(b'-')
+                    states[int(pin)] = int(state)
+                except ValueError:
+                    print(f'invalid response: {message}')
+
+            for pin, state in states.items():
+                try:
+                    setters[pin](state)
+                except KeyError:
+                    print(f'Unknown {pin=}: {state}')
 
     return _server
 
 
-def send_socket_message(message: [bytes]):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((HOST, SEND_PORT))
-        s.sendall(message)
-        print(f'Message sent (len: {len(message)}).')
+def send_socket_message(*messages: [bytes]):
+    send_socket.sendto(MESSAGE_SEPARATOR.join(messages), (HOST, SEND_PORT))
+    print(f'Message sent (count: {len(messages)}).')
 
 
 def main():